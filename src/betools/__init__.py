@@ -19,6 +19,14 @@ if "bpy" in locals():
     imp.reload(ui._panels)
     imp.reload(utils._constants)
     imp.reload(utils._uvs)
+    imp.reload(utils._profile)
+    imp.reload(utils._bounds)
+    imp.reload(utils._chain)
+    imp.reload(utils._texel)
+    imp.reload(utils._color_ids)
+    imp.reload(utils._raster)
+    imp.reload(utils._trim_image)
+    imp.reload(utils._trim_table)
 
     imp.reload(ops._autosmooth)
     imp.reload(ops._bevel)
@@ -41,12 +49,22 @@ if "bpy" in locals():
     imp.reload(ops._snapping)
     imp.reload(ops._trim)
 
+    imp.reload(checks._texel_audit)
+
 else:
     from . import _settings
     from .ui import _panels
 
     from .utils import _constants
     from .utils import _uvs
+    from .utils import _profile
+    from .utils import _bounds
+    from .utils import _chain
+    from .utils import _texel
+    from .utils import _color_ids
+    from .utils import _raster
+    from .utils import _trim_image
+    from .utils import _trim_table
 
     from .ops import _autosmooth
     from .ops import _bevel
@@ -69,6 +87,8 @@ else:
     from .ops import _snapping
     from .ops import _trim
 
+    from .checks import _texel_audit
+
 
 import bpy
         
@@ -92,8 +112,10 @@ classes = (
     _panels.UI_PT_UVLayout,
     _panels.UI_PT_UVTexel,
     _panels.UI_PT_UVTrim,
+    _panels.BETOOLS_UL_ColorIDs,
     _panels.UI_PT_UVColorID,
     _panels.UI_PT_UVUtils,
+    _settings.BETOOLSColorID,
     _settings.BETOOLSProperties
 )
 
@@ -103,6 +125,11 @@ def register():
     for cls in classes:
         bpy.utils.register_class(cls)
     bpy.types.Scene.betools_settings = bpy.props.PointerProperty(type=_settings.BETOOLSProperties)
+    bpy.types.Material.betools_texel_density = _settings.get_material_texel_density()
+    bpy.types.Material.betools_trim_template = _settings.get_material_trim_template()
+    for handler in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        handler.append(_settings.clear_color_id_palettes)
+    bpy.app.handlers.load_post.append(_settings.migrate_color_ids)
 
     # handle keymaps
     kc = bpy.context.window_manager.keyconfigs.addon
@@ -113,6 +140,13 @@ def register():
 
 def unregister():
     del bpy.types.Scene.betools_settings
+    del bpy.types.Material.betools_texel_density
+    del bpy.types.Material.betools_trim_template
+    for handler in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if _settings.clear_color_id_palettes in handler:
+            handler.remove(_settings.clear_color_id_palettes)
+    if _settings.migrate_color_ids in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_settings.migrate_color_ids)
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
     for km, kmi in addon_keymaps:
@@ -3,7 +3,9 @@
 # brucein3d@gmail.com                                           #
 #################################################################
 
+import re
 import bpy
+from bpy.app.handlers import persistent
 from . utils import _constants
 
 edit_pivot_mode = False
@@ -21,7 +23,20 @@ uv_map_rename_mode = False
 previous_unit = ''
 
 # columns and rows of mesh faces that can uv shells can be mapped to
-trim_slots = []
+# (utils._trim_table.TrimTable), also stored on the scene
+trim_table = None
+
+# library tables of the material trim templates by template name
+trim_library = {}
+
+# stage timings of the last rectify/squarify run (utils._profile.StageProfile)
+uv_profile = None
+
+# island texel density histogram of the last measurement
+texel_histogram = None
+
+# (count, 4) color ID palette arrays by settings pointer, cleared on edits
+color_id_palettes = {}
 
 ##############################################################################
 ##############################################################################
@@ -66,6 +81,39 @@ def show_uv_stretch(self, context):
 def uv_stretch_type(self, context):
     bpy.context.space_data.uv_editor.display_stretch_type = context.scene.betools_settings.uv_stretch_type
 
+# properties of the fixed palette that color_ids replaced
+_LEGACY_COLOR_ID = re.compile(r"color_id_(\d+|count)(_name|_rename)?$")
+
+@persistent
+def clear_color_id_palettes(*args):
+    color_id_palettes.clear()
+
+@persistent
+def migrate_color_ids(*args):
+    """Move the palette of files saved with the fixed color_id_N properties
+        into color_ids. Unset colors and names were never stored and keep
+        the defaults.
+    """
+
+    for scene in bpy.data.scenes:
+        settings = scene.betools_settings
+        legacy = [key for key in settings.keys() if _LEGACY_COLOR_ID.match(key)]
+        if not legacy:
+            continue
+
+        count = settings.get("color_id_count", 0)
+        if not len(settings.color_ids):
+            for i in range(count):
+                color_id = settings.color_ids.add()
+                color_id.name = settings.get("color_id_{}_name".format(i), "New Color")
+                color = settings.get("color_id_{}".format(i))
+                if color is not None:
+                    color_id.color = tuple(color)[:3]
+
+        for key in legacy:
+            del settings[key]
+    clear_color_id_palettes()
+
 def get_color():
     return bpy.props.FloatVectorProperty(
         name="Color",
@@ -73,7 +121,8 @@ def get_color():
         subtype="COLOR",
         default=(.1, .2, .8),
         size=3,
-        max=1.0, min=0.0
+        max=1.0, min=0.0,
+        update=clear_color_id_palettes
     )
 
 def get_name():
@@ -82,10 +131,19 @@ def get_name():
         default = "New Color"
     )
 
-def get_rename():
-    return bpy.props.BoolProperty(
-        name = "Rename ID Color",
-        default = False
+def get_material_texel_density():
+    return bpy.props.FloatProperty(
+        name="Texel Density",
+        description="Target texel density for faces using this material, the scene target when zero",
+        default=0.0,
+        min=0.0
+    )
+
+def get_material_trim_template():
+    return bpy.props.StringProperty(
+        name="Trim Template",
+        description="Template mesh or trim sheet image for faces using this material, the scene template when empty",
+        default=""
     )
 
 def update_units(self, context):
@@ -101,6 +159,11 @@ def update_units(self, context):
 ##############################################################################
 
 
+class BETOOLSColorID(bpy.types.PropertyGroup):
+    name : get_name()
+    color : get_color()
+
+
 class BETOOLSProperties(bpy.types.PropertyGroup):
 
     # ADDON PREFERENCES
@@ -169,6 +232,23 @@ class BETOOLSProperties(bpy.types.PropertyGroup):
 
     current_texel_density : bpy.props.FloatProperty(name='Texel Density', default=256.0)
     texel_density : bpy.props.FloatProperty(name='Texel Density', default=256.0)
+    texel_tolerance : bpy.props.FloatProperty(
+        name='Tolerance',
+        description='Allowed difference from the target texel density',
+        default=10.0,
+        min=0.0,
+        max=100.0,
+        subtype='PERCENTAGE')
+    texel_heatmap_min : bpy.props.FloatProperty(
+        name='Heatmap Min',
+        description='Texel density shown as fully blue in the heatmap',
+        default=128.0,
+        min=0.0)
+    texel_heatmap_max : bpy.props.FloatProperty(
+        name='Heatmap Max',
+        description='Texel density shown as fully red in the heatmap',
+        default=512.0,
+        min=0.0)
     
     texel_density_units : bpy.props.StringProperty(name='Texel Density Units', default="Centimeters")
     image_size : bpy.props.IntProperty(
@@ -179,7 +259,6 @@ class BETOOLSProperties(bpy.types.PropertyGroup):
         max=8192)
 
     material_name : bpy.props.StringProperty(name='New Color', default='New Color')
-    rename_material : bpy.props.StringProperty(name='Rename Color', default='New Color')
 
     map_size_dropdown : bpy.props.EnumProperty(
         items = _constants.MAP_SIZES,
@@ -193,79 +272,32 @@ class BETOOLSProperties(bpy.types.PropertyGroup):
         default = 'CHECKER'
 	)
 
-    color_id_count : bpy.props.IntProperty(
-        name="Color ID Count",
+    color_ids : bpy.props.CollectionProperty(type=BETOOLSColorID)
+
+    color_id_index : bpy.props.IntProperty(
+        name="Active Color ID",
         default = 0,
-        min=0,
-        max=15)
+        min=0)
 
     color_id_pixel_bleed : bpy.props.IntProperty(
         name="Bleed",
-        default = 8)
-
-    color_id_0 : get_color()
-    color_id_0_name : get_name()
-    color_id_0_rename : get_rename()
-
-    color_id_1 : get_color()
-    color_id_1_name : get_name()
-    color_id_1_rename : get_rename()
-
-    color_id_2 : get_color()
-    color_id_2_name : get_name()
-    color_id_2_rename : get_rename()
-
-    color_id_3 : get_color()
-    color_id_3_name : get_name()
-    color_id_3_rename : get_rename()
-
-    color_id_4 : get_color()
-    color_id_4_name : get_name()
-    color_id_4_rename : get_rename()
-
-    color_id_5 : get_color()
-    color_id_5_name : get_name()
-    color_id_5_rename : get_rename()
-
-    color_id_6 : get_color()
-    color_id_6_name : get_name()
-    color_id_6_rename : get_rename()
-
-    color_id_7 : get_color()
-    color_id_7_name : get_name()
-    color_id_7_rename : get_rename()
-
-    color_id_8 : get_color()
-    color_id_8_name : get_name()
-    color_id_8_rename : get_rename()
-
-    color_id_9 : get_color()
-    color_id_9_name : get_name()
-    color_id_9_rename : get_rename()
-
-    color_id_10 : get_color()
-    color_id_10_name : get_name()
-    color_id_10_rename : get_rename()
-
-    color_id_11 : get_color()
-    color_id_11_name : get_name()
-    color_id_11_rename : get_rename()
-
-    color_id_12 : get_color()
-    color_id_12_name : get_name()
-    color_id_12_rename : get_rename()
-
-    color_id_13 : get_color()
-    color_id_13_name : get_name()
-    color_id_13_rename : get_rename()
-
-    color_id_14 : get_color()
-    color_id_14_name : get_name()
-    color_id_14_rename : get_rename()
+        description="Pixel bleed around the islands for a 1024 map, scaled with the map size",
+        default = 8,
+        min=0)
+
+    color_id_auto_dropdown : bpy.props.EnumProperty(
+        items = _constants.COLOR_ID_AUTO_MODES,
+		name = "Auto Color ID",
+        description = "Faces that get the same color from Auto Color ID",
+        default = 'ISLAND'
+	)
 
-    color_id_15 : get_color()
-    color_id_15_name : get_name()
-    color_id_15_rename : get_rename()
+    color_id_clusters : bpy.props.IntProperty(
+        name="Directions",
+        description="Number of normal directions to group faces into",
+        default = 6,
+        min=1,
+        max=64)
 
     show_uv_stretch : bpy.props.BoolProperty(
         name = "UV Stretch",
@@ -293,8 +325,18 @@ class BETOOLSProperties(bpy.types.PropertyGroup):
     # Trim Settings
     trim_mesh : bpy.props.StringProperty(name='Trim Template', default="")
 
+    # slots detected from an image, used instead of the template mesh when set
+    trim_image : bpy.props.StringProperty(name='Trim Image', default="")
+
     trim_fit_dropdown : bpy.props.EnumProperty(
         items = _constants.TRIM_FIT_MODES,
 		name = "Fit Mode",
         default = 'VERTICAL'
 	)
+
+    trim_layout_dropdown : bpy.props.EnumProperty(
+        items = _constants.TRIM_LAYOUT_MODES,
+		name = "Shared Trims",
+        description = "Layout of UV shells snapped to the same trim",
+        default = 'OVERLAP'
+	)
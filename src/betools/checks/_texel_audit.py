@@ -0,0 +1,194 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Scene wide texel density audit, usable from the UI or headless:
+
+    blender -b file.blend --addons betools --python-expr
+        "import bpy; bpy.ops.scene.be_texel_audit(filepath='report.json')"
+
+See _texel_audit_batch.py for running it over many files.
+"""
+
+import os
+import csv
+import json
+import bpy
+import numpy as np
+from ..utils import _texel
+
+
+_CSV_FIELDS = [
+    "file", "object", "island", "faces", "area", "uv_area",
+    "image_width", "image_height", "density", "deviation", "passed"
+]
+
+
+def audit_object(obj, depsgraph, target, tolerance, default_size):
+    """Measure the evaluated mesh of an object per island
+
+    Returns:
+        dict or None when the mesh has no uvs
+
+    """
+
+    obj_eval = obj.evaluated_get(depsgraph)
+    mesh = obj_eval.to_mesh()
+    try:
+        data = _texel.get_mesh_arrays(obj_eval, mesh=mesh)
+        if data is None or not len(data["loop_start"]):
+            return None
+
+        labels = _texel.get_uv_island_labels(data)
+        face_area, face_uv_area = _texel.get_face_areas(data)
+        size_x, size_y = _texel.get_face_image_sizes(obj, data, default_size)
+        density, area, uv_area = _texel.get_island_density(
+            face_area, face_uv_area, labels, size_x, size_y)
+        face_counts = np.bincount(labels, minlength=len(density))
+
+        # image size of the island, from its first face
+        first_faces = np.full(len(density), len(labels), dtype=np.int64)
+        np.minimum.at(first_faces, labels, np.arange(len(labels)))
+        island_size_x = size_x[first_faces]
+        island_size_y = size_y[first_faces]
+
+        object_density = _texel.get_texel_density(
+            face_area.sum(), (face_uv_area * size_x * size_y).sum(), 1, 1)
+    finally:
+        obj_eval.to_mesh_clear()
+
+    deviation = np.zeros(len(density))
+    if target > 0.0:
+        deviation = density / target - 1.0
+    passed = (np.abs(deviation) <= tolerance) | (area <= 0.0)
+
+    islands = []
+    for i in range(len(density)):
+        islands.append({
+            "island": i,
+            "faces": int(face_counts[i]),
+            "area": float(area[i]),
+            "uv_area": float(uv_area[i]),
+            "image_width": int(island_size_x[i]),
+            "image_height": int(island_size_y[i]),
+            "density": float(density[i]),
+            "deviation": float(deviation[i]),
+            "passed": bool(passed[i])
+        })
+
+    return {
+        "object": obj.name,
+        "density": float(object_density),
+        "islands": islands,
+        "failed": int((~passed).sum()),
+        "passed": bool(passed.all())
+    }
+
+def audit_scene(scene, depsgraph, target, tolerance, default_size):
+    """Audit every mesh object of a scene against a target texel density
+
+    Args:
+        scene (bpy.types.Scene)
+        depsgraph (bpy.types.Depsgraph): evaluated scene
+        target (float): texel density in pixels per unit
+        tolerance (float): allowed deviation from the target, 0.1 is 10%
+        default_size (tuple): image size for faces without an image texture
+
+    Returns:
+        dict
+
+    """
+
+    objects = []
+    for obj in scene.objects:
+        if obj.type != 'MESH':
+            continue
+        result = audit_object(obj, depsgraph, target, tolerance, default_size)
+        if result is not None:
+            objects.append(result)
+
+    return {
+        "file": bpy.data.filepath,
+        "target": target,
+        "tolerance": tolerance,
+        "objects": objects,
+        "passed": all(obj["passed"] for obj in objects)
+    }
+
+def write_json(report, filepath):
+    with open(filepath, 'w') as report_file:
+        json.dump(report, report_file, indent=4)
+
+def write_csv(report, filepath):
+    """One row per island"""
+    with open(filepath, 'w', newline='') as report_file:
+        writer = csv.DictWriter(report_file, fieldnames=_CSV_FIELDS)
+        writer.writeheader()
+        for obj in report["objects"]:
+            for island in obj["islands"]:
+                row = {"file": report["file"], "object": obj["object"]}
+                row.update(island)
+                writer.writerow(row)
+
+
+class BETOOLS_OT_TexelAudit(bpy.types.Operator):
+    bl_idname = "scene.be_texel_audit"
+    bl_label = "Texel Density Audit"
+    bl_description = "Write a JSON or CSV texel density report for every mesh in the scene"
+    bl_options = {'REGISTER'}
+
+    filepath : bpy.props.StringProperty(
+        name="File Path",
+        description="Report path, .csv writes a table, anything else json",
+        subtype='FILE_PATH')
+
+    target : bpy.props.FloatProperty(
+        name="Target",
+        description="Target texel density, the scene setting when zero",
+        default=0.0,
+        min=0.0)
+
+    tolerance : bpy.props.FloatProperty(
+        name="Tolerance",
+        description="Allowed difference from the target, the scene setting when negative",
+        default=-1.0)
+
+    image_size : bpy.props.IntProperty(
+        name="Image Size",
+        description="Image size for materials without an image texture, the map size setting when zero",
+        default=0,
+        min=0)
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = bpy.path.ensure_ext(bpy.path.abspath("//texel_audit"), ".json")
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        settings = context.scene.betools_settings
+        target = self.target or settings.texel_density
+        tolerance = self.tolerance if self.tolerance >= 0.0 else settings.texel_tolerance / 100.0
+        size = self.image_size or int(settings.map_size_dropdown)
+
+        if not self.filepath:
+            self.report({'ERROR_INVALID_INPUT'}, "Set a report file path!")
+            return {'CANCELLED'}
+
+        report = audit_scene(
+            context.scene, context.evaluated_depsgraph_get(),
+            target, tolerance, (size, size))
+
+        filepath = bpy.path.abspath(self.filepath)
+        if os.path.splitext(filepath)[1].lower() == ".csv":
+            write_csv(report, filepath)
+        else:
+            write_json(report, filepath)
+
+        failed = sum(obj["failed"] for obj in report["objects"])
+        self.report({'INFO'}, "{} islands outside the texel density tolerance".format(failed))
+        return {'FINISHED'}
+
+
+bpy.utils.register_class(BETOOLS_OT_TexelAudit)
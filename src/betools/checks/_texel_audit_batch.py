@@ -0,0 +1,116 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Run the texel density audit over many .blend files in parallel Blender
+    processes. Plain python, no bpy needed:
+
+    python _texel_audit_batch.py --blender /path/to/blender --output reports
+        --target 512 --format csv assets/*.blend
+
+Reports mirror the folders of the .blend files below their common root.
+Exits with 1 when any file has islands outside the tolerance so it can gate
+a build.
+"""
+
+import os
+import sys
+import csv
+import json
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+_AUDIT_EXPR = (
+    "import bpy, sys\n"
+    "result = bpy.ops.scene.be_texel_audit(filepath={filepath!r}, target={target!r}, "
+    "tolerance={tolerance!r}, image_size={image_size!r})\n"
+    "sys.exit(0 if 'FINISHED' in result else 2)\n"
+)
+
+
+def audit_file(blender, blend_file, report_path, target, tolerance, image_size):
+    """Audit one .blend file in a background Blender process
+
+    Returns:
+        (blend file, return code, report path)
+
+    """
+
+    expression = _AUDIT_EXPR.format(
+        filepath=report_path, target=target, tolerance=tolerance, image_size=image_size)
+    command = [
+        blender, "-b", blend_file,
+        "--addons", "betools",
+        "--python-exit-code", "2",
+        "--python-expr", expression
+    ]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return blend_file, process.returncode, report_path
+
+def get_report_paths(blend_files, output, report_format):
+    """Report path of each .blend file, mirroring the folders below their
+        common root so files of the same name don't share a report
+
+    Returns:
+        dict of absolute blend file path to absolute report path
+
+    """
+
+    blend_files = list(dict.fromkeys(os.path.abspath(blend_file) for blend_file in blend_files))
+    root = os.path.commonpath([os.path.dirname(blend_file) for blend_file in blend_files])
+    report_paths = {}
+    for blend_file in blend_files:
+        name = os.path.splitext(os.path.relpath(blend_file, root))[0]
+        report_paths[blend_file] = os.path.abspath(os.path.join(output, "{}.{}".format(name, report_format)))
+    return report_paths
+
+def report_failed(report_path):
+    """True when a report has islands outside the tolerance"""
+    with open(report_path, newline='') as report_file:
+        if report_path.lower().endswith(".csv"):
+            return any(row["passed"] == "False" for row in csv.DictReader(report_file))
+        return not json.load(report_file)["passed"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Texel density audit for .blend files")
+    parser.add_argument("files", nargs="+", help=".blend files to audit")
+    parser.add_argument("--blender", default="blender", help="Blender executable")
+    parser.add_argument("--output", default=".", help="Report directory")
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--target", type=float, default=0.0, help="Texel density, the file's setting when zero")
+    parser.add_argument("--tolerance", type=float, default=-1.0, help="Allowed deviation, 0.1 is 10%%")
+    parser.add_argument("--image-size", type=int, default=0, help="Size for materials without an image")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    report_paths = get_report_paths(args.files, args.output, args.format)
+    for report_path in report_paths.values():
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+
+    jobs = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for blend_file, report_path in report_paths.items():
+            jobs.append(pool.submit(
+                audit_file, args.blender, blend_file, report_path,
+                args.target, args.tolerance, args.image_size))
+
+    failed = False
+    for job in jobs:
+        blend_file, return_code, report_path = job.result()
+        if return_code != 0 or not os.path.isfile(report_path):
+            print("ERROR   {}".format(blend_file))
+            failed = True
+        elif report_failed(report_path):
+            print("FAILED  {} -> {}".format(blend_file, report_path))
+            failed = True
+        else:
+            print("OK      {} -> {}".format(blend_file, report_path))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
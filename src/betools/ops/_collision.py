@@ -6,9 +6,17 @@
 
 import bpy
 import math
-from mathutils import Vector
+import numpy as np
+from mathutils import Matrix, Vector
 
 from .. import _settings
+from ..utils import _bounds
+
+
+# corner signs of a box in the vertex order of generate_bounding_box_verts
+_BOX_CORNERS = np.array((
+    (1, 1, -1), (1, -1, -1), (-1, -1, -1), (-1, 1, -1),
+    (1, 1, 1), (1, -1, 1), (-1, -1, 1), (-1, 1, 1)), dtype=np.float64)
 
 
 class UE4CollisionGenerator(bpy.types.Operator):
@@ -18,32 +26,44 @@ class UE4CollisionGenerator(bpy.types.Operator):
     bl_description = "Create collision geometry for Unreal Engine 4"
     bl_options = {'REGISTER', 'UNDO'}
 
-    def get_bounding_box(self):
+    def get_bounding_box(self, selection=None):
 
-        selection = bpy.context.active_object
+        if selection is None:
+            selection = bpy.context.active_object
 
         if selection.mode == 'EDIT':
             bpy.ops.object.mode_set(mode = 'OBJECT')
 
-        vertices = selection.data.vertices
-        vert_positions = [vertex.co @ selection.matrix_world for vertex in vertices]
-        self.rotation = bpy.data.objects[selection.name].rotation_euler
-        self.obj_location = bpy.data.objects[selection.name].location
+        self.rotation = selection.rotation_euler
+        self.obj_location = selection.matrix_world.to_translation()
 
-        bb_min = Vector()
-        bb_max = Vector()
-
-        for axis in range(3):
-            pos_list = [pos[axis] for pos in vert_positions]
-            bb_max[axis] = max(pos_list)
-            bb_min[axis] = min(pos_list)
-
-        self.center = (bb_min + bb_max) / 2.0
-        self.location = self.obj_location + self.center
-        bounding_box = [bb_min, bb_max]
+        # world space bounds, relative to the object origin
+        bb_min, bb_max, center = _bounds.get_world_bounds(selection)
+        self.location = Vector(center)
+        self.center = self.location - self.obj_location
+        bounding_box = [Vector(bb_min) - self.obj_location, Vector(bb_max) - self.obj_location]
 
         return bounding_box
 
+    def get_oriented_box_verts(self, selection):
+        """Corners of the tightest box around the object in its own frame,
+            relative to the object origin, in the order of
+            generate_bounding_box_verts
+        """
+
+        matrix_world = selection.matrix_world
+        scale = Matrix.Diagonal(matrix_world.to_scale()).to_4x4()
+        center, axes, extents = _bounds.fit_oriented_box(_bounds.get_vertex_positions(selection, scale))
+        rotation = np.array(matrix_world.to_quaternion().to_matrix())
+        corners = center + (_BOX_CORNERS * extents) @ axes
+        return (corners @ rotation.T).tolist()
+
+    def get_selected_meshes(self, context):
+        objects = [obj for obj in context.selected_objects if obj.type == 'MESH']
+        if not objects:
+            objects = [context.active_object]
+        return objects
+
     def generate_bounding_box_verts(self, verts):  # bounding box min and max vector
 
         vertices = []
@@ -149,18 +169,26 @@ class UBXCollisionGenerator(UE4CollisionGenerator):
     bl_description = "Create UBX (Box) collision geometry for Unreal Engine 4"
     bl_options = {'REGISTER', 'UNDO'}
 
-    def fill_bounding_box_mesh(self, name):
+    use_oriented : bpy.props.BoolProperty(
+        name="Oriented",
+        description="Fit the tightest rotated box instead of a world aligned one",
+        default=True
+    )
+
+    def fill_bounding_box_mesh(self, selection, name):
         
         collection = bpy.context.collection
 
         mesh = bpy.data.meshes.new("ubx_collision_mesh")
-        bbox = self.get_bounding_box()
-        verts = self.generate_bounding_box_verts(bbox)
+        if self.use_oriented:
+            verts = self.get_oriented_box_verts(selection)
+        else:
+            verts = self.generate_bounding_box_verts(self.get_bounding_box(selection))
         faces = self.generate_bounding_box_faces()
         mesh.from_pydata(verts, [], faces)
 
         obj = bpy.data.objects.new(name, mesh)
-        obj.location = self.location - self.center
+        obj.location = selection.matrix_world.to_translation()
 
         collection.objects.link(obj)
         bpy.context.view_layer.objects.active = obj
@@ -168,8 +196,8 @@ class UBXCollisionGenerator(UE4CollisionGenerator):
         self.apply_material(obj)
 
     def execute(self, context):
-        selection = bpy.context.active_object
-        self.fill_bounding_box_mesh(self.get_name(selection, "UBX_"))
+        for selection in self.get_selected_meshes(context):
+            self.fill_bounding_box_mesh(selection, self.get_name(selection, "UBX_"))
         return {'FINISHED'}
 
 
@@ -179,18 +207,26 @@ class UCXBoxCollisionGenerator(UE4CollisionGenerator):
     bl_description = "Create UCX (Convex) collision geometry based on the objects bounding box for Unreal Engine 4"
     bl_options = {'REGISTER', 'UNDO'}
 
-    def fill_bounding_box_mesh(self, name):
+    use_oriented : bpy.props.BoolProperty(
+        name="Oriented",
+        description="Fit the tightest rotated box instead of a world aligned one",
+        default=True
+    )
+
+    def fill_bounding_box_mesh(self, selection, name):
         
         collection = bpy.context.collection
 
         mesh = bpy.data.meshes.new("ucx_box_collision_mesh")
-        bbox = self.get_bounding_box()
-        verts = self.generate_bounding_box_verts(bbox)
+        if self.use_oriented:
+            verts = self.get_oriented_box_verts(selection)
+        else:
+            verts = self.generate_bounding_box_verts(self.get_bounding_box(selection))
         faces = self.generate_bounding_box_faces()
         mesh.from_pydata(verts, [], faces)
 
         obj = bpy.data.objects.new(name, mesh)
-        obj.location = self.location - self.center
+        obj.location = selection.matrix_world.to_translation()
 
         collection.objects.link(obj)
         bpy.context.view_layer.objects.active = obj
@@ -198,8 +234,8 @@ class UCXBoxCollisionGenerator(UE4CollisionGenerator):
         self.apply_material(obj)
 
     def execute(self, context):
-        selection = bpy.context.active_object
-        self.fill_bounding_box_mesh(self.get_name(selection, "UCX_"))
+        for selection in self.get_selected_meshes(context):
+            self.fill_bounding_box_mesh(selection, self.get_name(selection, "UCX_"))
         return {'FINISHED'}
 
 
@@ -245,23 +281,21 @@ class USPCollisionGenerator(UE4CollisionGenerator):
     bl_description = "Create sphere collision for UE4"
     bl_options = {"REGISTER", "UNDO"}
 
-    def get_radius(self):
-        bbox = self.get_bounding_box()  # generates min and max
-        dimensions = []
-        x_dim = abs(bbox[1].x - bbox[0].x)
-        dimensions.append(x_dim)
-        y_dim = abs(bbox[1].y - bbox[0].y)
-        dimensions.append(y_dim)
-        z_dim = abs(bbox[1].z - bbox[0].z)
-        dimensions.append(z_dim)
-        sorted_dimensions = sorted(dimensions)
-        a = sorted_dimensions[-1] / 2.0
-        b = sorted_dimensions[-2] / 2.0
-        r = math.sqrt(a*a+b*b)
-        return r
-
-    def make_sphere(self, rad, loc, rot):
-        selection = bpy.context.active_object
+    def get_radius(self, selection=None):
+        """Radius of the minimum sphere around the object's world space
+            vertices, its center is stored in self.location
+        """
+
+        if selection is None:
+            selection = bpy.context.active_object
+        self.rotation = selection.rotation_euler
+        center, radius = _bounds.get_min_sphere(_bounds.get_vertex_positions(selection))
+        self.location = Vector(center)
+        return radius
+
+    def make_sphere(self, rad, loc, rot, selection=None):
+        if selection is None:
+            selection = bpy.context.active_object
         name = self.get_name(selection, "USP_")
         bpy.ops.mesh.primitive_uv_sphere_add(segments=8, ring_count=8, radius=rad, enter_editmode=False, align='WORLD', location=loc, rotation=rot)
         selection = bpy.context.active_object
@@ -269,8 +303,9 @@ class USPCollisionGenerator(UE4CollisionGenerator):
         selection.name = name
 
     def execute(self, context):
-        radius = self.get_radius()
-        self.make_sphere(radius, self.location, self.rotation)
+        for selection in self.get_selected_meshes(context):
+            radius = self.get_radius(selection)
+            self.make_sphere(radius, self.location, self.rotation, selection)
         return{'FINISHED'}
 
 
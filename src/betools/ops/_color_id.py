@@ -1,12 +1,20 @@
 
 import bpy
 import bmesh
-from bpy.props import IntProperty
+import numpy as np
 
-from ..utils import _uvs
+from ..utils import _ui
+from ..utils import _raster
+from ..utils import _texel
+from ..utils import _color_ids
+from ..utils._profile import StageProfile
 from .. import _settings
 
 
+# custom property tagging pooled ID materials with their color ID index
+_ID_PROPERTY = "betools_color_id"
+
+
 class BETOOLS_OT_AddColor(bpy.types.Operator):
     bl_idname = "uv.be_add_color"
     bl_label = "Add Color for ID Map"
@@ -15,62 +23,39 @@ class BETOOLS_OT_AddColor(bpy.types.Operator):
 
     def execute(self, context):
         settings = context.scene.betools_settings
-        settings.color_id_count += 1
-
-        if settings.color_id_count > 15:
-            self.report({"WARNING"}, "Reached the maximum number of colors!")
-            return {'FINISHED'}
-
-        setattr(settings, "color_id_{}_name".format(settings.color_id_count - 1), settings.material_name)
+        color_id = settings.color_ids.add()
+        color_id.name = settings.material_name
+        settings.color_id_index = len(settings.color_ids) - 1
         settings.material_name = "New Color"
+        _settings.clear_color_id_palettes()
         return {'FINISHED'}
 
 
 class BETOOLS_OT_RemoveColor(bpy.types.Operator):
     bl_idname = "uv.be_remove_color"
     bl_label = "Remove Color for ID Map"
-    bl_description = "Remove a color from the ID bake"
+    bl_description = "Remove the active color from the ID bake, its faces lose their ID"
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
         settings = context.scene.betools_settings
-        if settings.color_id_count > 0:
-            settings.color_id_count -= 1
-
-        return {'FINISHED'}
-
-
-class BETOOLS_OT_EnableRename(bpy.types.Operator):
-    bl_idname = "uv.be_enable_rename_color"
-    bl_label = "Enable Rename Color"
-    bl_description = "Enable rename color ID material"
-    bl_options = {'REGISTER', 'UNDO'}
-
-    index : bpy.props.IntProperty(
-        name="Index"
-    )
-
-    def execute(self, context):
-        settings = context.scene.betools_settings
-        setattr(settings, "color_id_{}_rename".format(self.index), True)
-        return {'FINISHED'}
-
+        index = settings.color_id_index
+        if index >= len(settings.color_ids):
+            return {'FINISHED'}
 
-class BETOOLS_OT_RenameID(bpy.types.Operator):
-    bl_idname = "uv.be_rename_color"
-    bl_label = "Rename Color"
-    bl_description = "Rename color ID material"
-    bl_options = {'REGISTER', 'UNDO'}
+        settings.color_ids.remove(index)
+        settings.color_id_index = min(index, max(0, len(settings.color_ids) - 1))
+        _settings.clear_color_id_palettes()
 
-    index : bpy.props.IntProperty(
-        name="Index"
-    )
+        # later IDs move down one palette entry
+        _color_ids.remove_face_id(index)
+        for mat in bpy.data.materials:
+            mat_index = mat.get(_ID_PROPERTY)
+            if mat_index == index:
+                del mat[_ID_PROPERTY]
+            elif mat_index is not None and mat_index > index:
+                mat[_ID_PROPERTY] = mat_index - 1
 
-    def execute(self, context):
-        settings = context.scene.betools_settings
-        setattr(settings, "color_id_{}_name".format(self.index), settings.rename_material)
-        settings.rename_material = "New Color"
-        setattr(settings, "color_id_{}_rename".format(self.index), False)
         return {'FINISHED'}
 
     
@@ -84,45 +69,49 @@ class BETOOLS_OT_AssignColor(bpy.types.Operator):
         name="Index"
     )
 
+    use_material : bpy.props.BoolProperty(
+        name="Use Material",
+        description="Also assign the ID's material, for baking with Cycles",
+        default=False
+    )
+
     def execute(self, context):
         settings = context.scene.betools_settings
         obj = bpy.context.active_object
-        me = obj.data
-        bm = bmesh.from_edit_mesh(me)
-        uv_layer = bm.loops.layers.uv.verify()
-        uvs = _uvs.get_selected_uvs(bm, uv_layer)
-        if not uvs:
+        if self.index >= len(settings.color_ids):
+            self.report({'ERROR_INVALID_INPUT'}, "No color with that index!")
+            return {'FINISHED'}
+
+        # faces with all their uvs selected
+        data = _texel.get_mesh_arrays(obj)
+        face_mask = np.zeros(len(data["loop_start"]), dtype=bool)
+        if len(face_mask):
+            face_mask = data["face_select"] & np.logical_and.reduceat(data["uv_select"], data["loop_start"])
+        if not face_mask.any():
             self.report({'ERROR_INVALID_INPUT'}, "Select some UVs!")
+            return {'FINISHED'}
+
+        _color_ids.set_face_ids(obj, face_mask, self.index)
+        if not self.use_material:
+            return {'FINISHED'}
 
         # modify the color to match
-        color = tuple(getattr(settings, "color_id_{}".format(self.index))) + (1.0,)
-        material_name = "BE_ID_{}".format(getattr(settings, "color_id_{}_name".format(self.index)))
-        
-        mat = bpy.data.materials.new(name=material_name)
-        mat.use_nodes=True
-        mat.node_tree.nodes["Principled BSDF"].inputs[0].default_value = color
-        obj.data.materials.append(mat)
-
-        # get material index
-        mat_index = len(obj.data.materials) - 1
+        color_id = settings.color_ids[self.index]
+        color = tuple(color_id.color) + (1.0,)
+        material_name = "BE_ID_{}".format(color_id.name)
+
+        # one material per ID, one slot per material
+        mat = get_id_material(self.index, material_name, color)
+        mat_index = get_material_slot(obj, mat)
         bpy.context.object.active_material_index = mat_index
-        
-        _uvs.store_selection()
 
         # assign to selected faces via selected uvs
-        for face in bm.faces:
-            if face.select:
-                count = 0
-                for loop in face.loops:
-                    if loop[uv_layer].select:
-                        count+=1
-                if not count == len(face.loops):
-                    face.select = False
-
-        # assign to selected faces
-        bpy.ops.object.material_slot_assign()
-
-        _uvs.restore_selection()
+        me = obj.data
+        bm = bmesh.from_edit_mesh(me)
+        bm.faces.ensure_lookup_table()
+        for face_index in np.flatnonzero(face_mask).tolist():
+            bm.faces[face_index].material_index = mat_index
+
         bmesh.update_edit_mesh(me)
         return {'FINISHED'}
 
@@ -139,10 +128,59 @@ class BETOOLS_OT_AssignColor(bpy.types.Operator):
         return True
 
 
+class BETOOLS_OT_AutoColorID(bpy.types.Operator):
+    bl_idname = "uv.be_auto_color_id"
+    bl_label = "Auto Color ID"
+    bl_description = "Assign palette colors per UV island, loose part or normal direction on the selected objects"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        settings = context.scene.betools_settings
+        palette = _color_ids.get_palette(settings)
+        if not len(palette):
+            self.report({'ERROR_INVALID_INPUT'}, "Add some colors first!")
+            return {'FINISHED'}
+
+        mode = settings.color_id_auto_dropdown
+        objects = [obj for obj in context.selected_objects if obj.type == 'MESH']
+        if context.active_object is not None and context.active_object.type == 'MESH' and context.active_object not in objects:
+            objects.append(context.active_object)
+
+        meshes = [(obj, _texel.get_mesh_arrays(obj)) for obj in objects]
+        meshes = [(obj, data) for obj, data in meshes if data is not None and len(data["loop_start"])]
+        if not meshes:
+            self.report({'ERROR_INVALID_INPUT'}, "Select some meshes with UV maps!")
+            return {'FINISHED'}
+
+        if mode == 'NORMAL':
+            # cluster every object together so a direction has one color
+            normals, areas = zip(*(_color_ids.get_face_normals(data) for _, data in meshes))
+            labels = _color_ids.cluster_normals(
+                np.concatenate(normals), settings.color_id_clusters, np.concatenate(areas))
+            splits = np.cumsum([len(data["loop_start"]) for _, data in meshes])[:-1]
+            object_labels = np.split(labels, splits)
+        else:
+            # number groups across objects so each gets its own color
+            object_labels = []
+            offset = 0
+            for _, data in meshes:
+                labels = _color_ids.get_auto_labels(data, mode)
+                object_labels.append(labels + offset)
+                offset += int(labels.max()) + 1
+
+        group_count = max(int(labels.max()) + 1 for labels in object_labels)
+        for (obj, _), labels in zip(meshes, object_labels):
+            _color_ids.set_face_ids(obj, np.ones(len(labels), dtype=bool), labels % len(palette))
+
+        if group_count > len(palette):
+            self.report({'WARNING'}, "{} groups share {} colors".format(group_count, len(palette)))
+        return {'FINISHED'}
+
+
 class BETOOLS_OT_BakeID(bpy.types.Operator):
     bl_idname = "uv.be_bake_id"
     bl_label = "Bake ID Map"
-    bl_description = "Use cycles to bake a color ID map"
+    bl_description = "Bake a color ID map from the material colors"
     bl_options = {'REGISTER', 'UNDO'}
 
     margin : bpy.props.IntProperty(
@@ -154,9 +192,18 @@ class BETOOLS_OT_BakeID(bpy.types.Operator):
         default=2048
     )
 
+    use_cycles : bpy.props.BoolProperty(
+        name="Use Cycles",
+        description="Bake with Cycles instead of drawing the uv triangles directly",
+        default=False
+    )
+
     def execute(self, context):
 
         obj = bpy.context.active_object
+        if not self.use_cycles:
+            return self.rasterize(context, obj)
+
         # create the ID Map based on current map size or use existing map
         image = bpy.data.images.new("Color_ID", width=self.size, height=self.size)
         image.use_fake_user = True
@@ -190,6 +237,62 @@ class BETOOLS_OT_BakeID(bpy.types.Operator):
 
         return {'FINISHED'}
 
+    def rasterize(self, context, obj):
+        """Draw the ID map of all selected objects sharing the active object's
+            uv map into one atlas on the CPU, no render engine or mode switch
+            needed
+        """
+
+        if obj.type != 'MESH' or not obj.data.uv_layers:
+            self.report({'ERROR_INVALID_INPUT'}, "The object needs a UV map!")
+            return {'CANCELLED'}
+
+        uv_layer_name = obj.data.uv_layers.active.name
+        objects = [obj] + [other for other in context.selected_objects if other != obj and other.type == 'MESH']
+        palette = _color_ids.get_palette(context.scene.betools_settings)
+        profile = StageProfile("Color ID Bake")
+
+        tri_uvs = []
+        tri_colors = []
+        skipped = []
+        object_stages = []
+        for bake_obj in objects:
+            if uv_layer_name not in bake_obj.data.uv_layers:
+                skipped.append(bake_obj.name)
+                continue
+            # prefixed so object names can't collide with the fixed stages
+            stage = "Object: {}".format(bake_obj.name)
+            with profile.stage(stage):
+                triangles = _raster.get_color_id_triangles(bake_obj, palette, uv_layer_name)
+            tri_uvs.append(triangles[0])
+            tri_colors.append(triangles[1])
+            profile.count(stage, len(triangles[0]))
+            object_stages.append(stage)
+
+        with profile.stage("Rasterize"):
+            pixels = _raster.rasterize_triangles(
+                np.concatenate(tri_uvs), np.concatenate(tri_colors), self.size, self.size)
+        if self.margin > 0:
+            with profile.stage("Bleed"):
+                _raster.bleed_pixels(pixels, _raster.get_bleed_width(self.margin, self.size, self.size))
+        with profile.stage("Write Image"):
+            image = _raster.get_bake_image("Color_ID", self.size, self.size)
+            _raster.write_image_pixels(image, pixels)
+        profile.finish()
+        _settings.uv_profile = profile
+
+        editor = _ui.get_uv_editor(context)
+        if editor is not None:
+            editor.space.image = image
+
+        for name in object_stages:
+            stage = profile.stages[name]
+            self.report({'INFO'}, "{}: {:,} triangles in {:.1f} ms".format(name, stage["items"], stage["time"] * 1000.0))
+        if skipped:
+            self.report({'WARNING'}, "Skipped objects without a '{}' UV map: {}".format(uv_layer_name, ", ".join(skipped)))
+        self.report({'INFO'}, "Baked {} objects in {:.3f}s".format(len(tri_uvs), profile.total))
+        return {'FINISHED'}
+
     @classmethod
     def poll(cls, context):
         if not bpy.context.active_object:
@@ -213,6 +316,38 @@ class BETOOLS_OT_SwitchRenderer(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class BETOOLS_OT_CompactIDMats(bpy.types.Operator):
+    bl_idname = "uv.be_compact_id_mats"
+    bl_label = "Compact ID Mats"
+    bl_description = "Merge duplicate material slots of the selected objects, ID materials of the same color included"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        objects = [obj for obj in context.selected_objects if obj.type == 'MESH']
+        if context.active_object and context.active_object.type == 'MESH' and context.active_object not in objects:
+            objects.append(context.active_object)
+
+        previous_mode = context.object.mode if context.object else 'OBJECT'
+        if previous_mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        removed = 0
+        for obj in objects:
+            removed += compact_material_slots(obj)
+
+        if previous_mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode=previous_mode)
+
+        self.report({'INFO'}, "Merged {} material slots".format(removed))
+        return {'FINISHED'}
+
+    @classmethod
+    def poll(cls, context):
+        if not bpy.context.active_object:
+            return False
+        return True
+
+
 class BETOOLS_OT_ClearIDMats(bpy.types.Operator):
     bl_idname = "uv.be_clear_id_mats"
     bl_label = "Clear ID Mats"
@@ -235,11 +370,84 @@ class BETOOLS_OT_ClearIDMats(bpy.types.Operator):
         return {'FINISHED'}
 
 
+def get_id_material(index, name, color):
+    """The pooled material of a color ID, created on first use. The pooled
+        material follows renames and color changes of its ID.
+    """
+
+    for mat in bpy.data.materials:
+        if mat.get(_ID_PROPERTY) == index:
+            break
+    else:
+        mat = bpy.data.materials.new(name=name)
+        mat[_ID_PROPERTY] = index
+        mat.use_nodes = True
+
+    if mat.name != name:
+        mat.name = name
+    mat.diffuse_color = color
+    node = mat.node_tree.nodes.get("Principled BSDF") if mat.node_tree else None
+    if node is not None:
+        node.inputs[0].default_value = color
+    return mat
+
+def get_material_slot(obj, mat):
+    """Index of the material's slot on the object, adding one if needed"""
+    for index, slot in enumerate(obj.material_slots):
+        if slot.material == mat:
+            return index
+    obj.data.materials.append(mat)
+    return len(obj.data.materials) - 1
+
+def _get_slot_key(mat):
+    """Slots with equal keys are merged. ID materials match by their color
+        ID, or by color for ones made before the material pool.
+    """
+
+    if mat is None:
+        return None
+    if mat.get(_ID_PROPERTY) is not None:
+        return ("ID", mat[_ID_PROPERTY])
+    if mat.name.startswith("BE_ID"):
+        return ("COLOR", tuple(round(value, 4) for value in _raster.get_material_color(mat)))
+    return mat.name
+
+def compact_material_slots(obj):
+    """Merge duplicate material slots of a mesh in object mode, remapping
+        the face material indices in one write
+
+    Returns:
+        number of slots removed
+
+    """
+
+    mesh = obj.data
+    materials = list(mesh.materials)
+    keys = [_get_slot_key(mat) for mat in materials]
+    unique = list(dict.fromkeys(keys))
+    if len(unique) == len(keys):
+        return 0
+
+    remap = np.array([unique.index(key) for key in keys], dtype=np.int64)
+    kept = [materials[keys.index(key)] for key in unique]
+
+    face_materials = np.empty(len(mesh.polygons), dtype=np.int64)
+    mesh.polygons.foreach_get("material_index", face_materials)
+    face_materials = remap[np.clip(face_materials, 0, len(remap) - 1)]
+
+    mesh.materials.clear()
+    for mat in kept:
+        mesh.materials.append(mat)
+    mesh.polygons.foreach_set("material_index", face_materials.astype(np.int32))
+    mesh.update()
+    return len(materials) - len(kept)
+
+
 bpy.utils.register_class(BETOOLS_OT_AddColor)
 bpy.utils.register_class(BETOOLS_OT_RemoveColor)
-bpy.utils.register_class(BETOOLS_OT_EnableRename)
-bpy.utils.register_class(BETOOLS_OT_RenameID)
 bpy.utils.register_class(BETOOLS_OT_AssignColor)
+bpy.utils.register_class(BETOOLS_OT_AutoColorID)
 bpy.utils.register_class(BETOOLS_OT_BakeID)
 bpy.utils.register_class(BETOOLS_OT_ClearIDMats)
+bpy.utils.register_class(BETOOLS_OT_CompactIDMats)
 bpy.utils.register_class(BETOOLS_OT_SwitchRenderer)
@@ -5,12 +5,14 @@
 
 import os
 import bpy
-import bmesh
-import math
-from bpy.props import EnumProperty, FloatVectorProperty, FloatProperty
-from mathutils import Vector
+import numpy as np
+from bpy.props import EnumProperty
 from ..utils import _uvs
 from ..utils import _constants
+from ..utils import _texel
+from ..utils import _raster
+from ..utils import _profile
+from .. import _settings
 
 
 _UNITS = {
@@ -20,6 +22,10 @@ _UNITS = {
     "Yards" : 1.09361
 }
 
+_HISTOGRAM_BINS = 12
+
+_HEATMAP_LAYER = "BT_TexelDensity"
+
 
 class BETOOLS_OT_GetTexel(bpy.types.Operator):
     bl_idname = "uv.be_get_texel"
@@ -42,18 +48,9 @@ class BETOOLS_OT_GetTexel(bpy.types.Operator):
             return {'FINISHED'}
 
         obj = bpy.context.active_object
-        me = obj.data
-        bm = bmesh.from_edit_mesh(me)
-        uv_layer = bm.loops.layers.uv.verify()
-
         current_texture = _uvs.get_current_image()
-        islands = _uvs.get_selected_islands(bm, uv_layer)
-
-        if not islands:
-            self.report({'ERROR_INVALID_INPUT'}, "Select a UV island!")
-            return {'FINISHED'}
 
-        texel_density = get_texel_density(self, context, current_texture, bm, uv_layer)
+        texel_density = get_texel_density(self, context, obj, current_texture)
         if not texel_density:
             return {'FINISHED'}
 
@@ -64,7 +61,7 @@ class BETOOLS_OT_GetTexel(bpy.types.Operator):
 class BETOOLS_OT_SetTexel(bpy.types.Operator):
     bl_idname = "uv.be_set_texel"
     bl_label = "Set Texel Density"
-    bl_description = "Set the texel density of the selected UV island"
+    bl_description = "Set the texel density of the selected UV islands, or every island of the selected objects in object mode"
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
@@ -73,28 +70,132 @@ class BETOOLS_OT_SetTexel(bpy.types.Operator):
             self.report({'ERROR_INVALID_INPUT'}, "Select or create an image!")
             return {'FINISHED'}
 
-        obj = bpy.context.active_object
-        me = obj.data
-        bm = bmesh.from_edit_mesh(me)
-        uv_layer = bm.loops.layers.uv.verify()
-
         current_texture = _uvs.get_current_image()
         texel_density = context.scene.betools_settings.texel_density
         if not texel_density:
             return {'FINISHED'}
             
-        set_texel_density(self, context, current_texture, bm, me, uv_layer, texel_density)
+        set_texel_density(self, context, get_texel_objects(context), current_texture, texel_density)
         return {'FINISHED'}
 
     @classmethod
     def poll(cls, context):
         if context.object is None:
             return False
-        if len(bpy.context.selected_objects) > 1:
+        if context.mode == 'EDIT_MESH' and context.scene.tool_settings.use_uv_select_sync:
             return False
-        if context.scene.tool_settings.use_uv_select_sync:
+        return bool(get_texel_objects(context))
+
+
+class BETOOLS_OT_SetMaterialTexel(bpy.types.Operator):
+    bl_idname = "uv.be_set_material_texel"
+    bl_label = "Set Texel Density by Material"
+    bl_description = "Set the texel density of every island to the target and image size of its material"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        if context.mode == 'EDIT_MESH' and context.scene.tool_settings.use_uv_select_sync:
             return False
-        return True
+        return bool(get_texel_objects(context))
+
+    def execute(self, context):
+        settings = context.scene.betools_settings
+        if not settings.texel_density:
+            return {'FINISHED'}
+
+        set_material_texel_density(
+            self, context, get_texel_objects(context),
+            get_texel_image_size(context), settings.texel_density)
+        return {'FINISHED'}
+
+
+class BETOOLS_OT_TexelHistogram(bpy.types.Operator):
+    bl_idname = "uv.be_texel_histogram"
+    bl_label = "Texel Density Histogram"
+    bl_description = "Measure the texel density of every UV island of the selected objects"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        return bool(get_texel_objects(context))
+
+    def execute(self, context):
+        settings = context.scene.betools_settings
+        size_x, size_y = get_texel_image_size(context)
+        islands = measure_islands(get_texel_objects(context), size_x, size_y)
+
+        densities = [island["density"][island["area"] > 0.0] for island in islands]
+        densities = np.concatenate(densities) if densities else np.empty(0)
+        _settings.texel_histogram = build_texel_histogram(
+            densities, settings.texel_density, settings.texel_tolerance / 100.0)
+        return {'FINISHED'}
+
+
+class BETOOLS_OT_SelectTexelOutliers(bpy.types.Operator):
+    bl_idname = "uv.be_select_texel_outliers"
+    bl_label = "Select Texel Outliers"
+    bl_description = "Select the UV islands outside the tolerance of the target texel density"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return bool(get_texel_objects(context))
+
+    def execute(self, context):
+        settings = context.scene.betools_settings
+        size_x, size_y = get_texel_image_size(context)
+        tolerance = settings.texel_tolerance / 100.0
+        low = settings.texel_density * (1.0 - tolerance)
+        high = settings.texel_density * (1.0 + tolerance)
+
+        islands = measure_islands(get_texel_objects(context), size_x, size_y)
+        densities = []
+        outlier_count = 0
+        for island in islands:
+            measured = island["area"] > 0.0
+            outliers = measured & ((island["density"] < low) | (island["density"] > high))
+            _texel.set_face_selection(island["object"], island["data"], outliers[island["labels"]])
+            densities.append(island["density"][measured])
+            outlier_count += int(outliers.sum())
+
+        densities = np.concatenate(densities) if densities else np.empty(0)
+        _settings.texel_histogram = build_texel_histogram(densities, settings.texel_density, tolerance)
+        self.report({'INFO'}, "Selected {} UV islands".format(outlier_count))
+        return {'FINISHED'}
+
+
+class BETOOLS_OT_TexelHeatmap(bpy.types.Operator):
+    bl_idname = "uv.be_texel_heatmap"
+    bl_label = "Texel Density Heatmap"
+    bl_description = "Color the faces of the selected objects by texel density. Blue is below, green on and red above the target"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return bool(get_texel_objects(context))
+
+    def execute(self, context):
+        settings = context.scene.betools_settings
+        size_x, size_y = get_texel_image_size(context)
+        low = min(settings.texel_heatmap_min, settings.texel_density)
+        high = max(settings.texel_heatmap_max, settings.texel_density)
+
+        for obj in get_texel_objects(context):
+            data = _texel.get_mesh_arrays(obj)
+            if data is None:
+                continue
+            face_area, face_uv_area = _texel.get_face_areas(data)
+            density = _texel.get_texel_density(face_area, face_uv_area, size_x, size_y)
+            face_colors = _texel.get_heatmap_colors(density, low, settings.texel_density, high)
+            _texel.set_loop_colors(obj, _HEATMAP_LAYER, face_colors[data["loop_faces"]])
+
+        # show vertex colors when run from a solid shaded viewport, other
+        # viewports keep their shading
+        space = context.space_data
+        if space is not None and space.type == 'VIEW_3D' and space.shading.type == 'SOLID':
+            space.shading.color_type = 'VERTEX'
+        return {'FINISHED'}
 
 
 class BETOOLS_OT_CubeHelper(bpy.types.Operator):
@@ -155,6 +256,33 @@ class BETOOLS_OT_CreateImage(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class BETOOLS_OT_BleedImage(bpy.types.Operator):
+    bl_idname = "uv.be_bleed_image"
+    bl_label = "Bleed Image"
+    bl_description = "Extend the island colors of the UV editor image into its transparent pixels"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    bleed : bpy.props.IntProperty(
+        name='Bleed',
+        description="Bleed in pixels for a 1024 map, scaled with the image size",
+        default=8,
+        min=1
+    )
+
+    @classmethod
+    def poll(cls, context):
+        image = _uvs.get_current_image()
+        return image is not None and image.size[0] != 0
+
+    def execute(self, context):
+        image = _uvs.get_current_image()
+        width, height = image.size
+        pixels = _raster.read_image_pixels(image)
+        _raster.bleed_pixels(pixels, _raster.get_bleed_width(self.bleed, width, height))
+        _raster.write_image_pixels(image, pixels)
+        return {'FINISHED'}
+
+
 class BETOOLS_OT_AssignMat(bpy.types.Operator):
     bl_idname = "uv.be_assign_mat"
     bl_label = "Assign Material"
@@ -232,104 +360,241 @@ def assign_material(obj, mat):
         bpy.context.area.spaces.active.image = image
 
 
-def get_texel_density(op, context, uv_image, bm, uv_layer):
+def get_texel_density(op, context, obj, uv_image):
+    """Texel density of the selected uv island, measured over all of its
+        faces from their loop triangles in world space
+    """
 
-    mesh_faces = get_selected_object_faces()
-    if not mesh_faces:
+    if obj is None or obj.type != 'MESH':
         op.report({'ERROR_INVALID_INPUT'}, "Select a mesh")
         return None
 
-    uv_sum = 0
-    vert_sum = 0
+    data = _texel.get_mesh_arrays(obj)
+    if data is None:
+        op.report({'ERROR_INVALID_INPUT'}, "Select a mesh")
+        return None
 
-    islands = _uvs.get_selected_islands(bm, uv_layer)
-    if len(islands) != 1:
+    labels = _texel.get_uv_island_labels(data)
+    selected_islands = np.unique(labels[_texel.get_selected_face_mask(data)])
+    if len(selected_islands) == 0:
+        op.report({'ERROR_INVALID_INPUT'}, "Select a UV island!")
+        return None
+    if len(selected_islands) != 1:
         op.report({'ERROR_INVALID_INPUT'}, "Select ONE uv island when measuring texel density!")
         return None
 
-    for face in islands[0]:
-        uv_tri = [loop[uv_layer].uv for loop in face.loops]
-        vert_tri = [vert.co for vert in face.verts]
-
-        uv_area = _uvs.get_area_triangle_uv(
-            uv_tri[0], uv_tri[1], uv_tri[2],
-            uv_image.size[0], uv_image.size[1])
+    face_area, face_uv_area = _texel.get_face_areas(data)
+    density, area, uv_area = _texel.get_island_density(
+        face_area, face_uv_area, labels,
+        uv_image.size[0], uv_image.size[1])
 
-        face_area = _uvs.get_area_triangle(
-            vert_tri[0], vert_tri[1], vert_tri[2]
-        )
+    return float(density[selected_islands[0]])
 
-        uv_sum += math.sqrt(uv_area) * min(uv_image.size[0], uv_image.size[1])
-        vert_sum += math.sqrt(face_area)
-        
-    if uv_sum == 0 or vert_sum == 0:
-        return 0.00
-    else:
-        return uv_sum / vert_sum
+def set_texel_density(op, context, objects, uv_image, density):
+    """Scale the uv islands of every object to the given texel density.
+        Only islands with selected faces are scaled for objects in edit mode.
+    """
 
-def set_texel_density(op, context, uv_image, bm, me, uv_layer, density):
+    profile = _profile.StageProfile("Set Texel Density")
+    for obj, (data, face_mask) in get_selected_object_faces(objects, profile).items():
+        scale_to_texel_density(
+            obj, data, face_mask,
+            uv_image.size[0], uv_image.size[1], density, profile)
+    profile.finish()
+    _settings.uv_profile = profile
+
+def set_material_texel_density(op, context, objects, default_size, default_density):
+    """Scale the uv islands of every object to the texel density of their
+        materials, measured against each material's own image size. Islands
+        spanning several materials use the area weighted target.
     """
+
+    profile = _profile.StageProfile("Set Material Texel Density")
+    for obj, (data, face_mask) in get_selected_object_faces(objects, profile).items():
+        size_x, size_y = _texel.get_face_image_sizes(obj, data, default_size)
+        face_density = _texel.get_face_targets(obj, data, default_density)
+        scale_to_texel_density(obj, data, face_mask, size_x, size_y, face_density, profile)
+    profile.finish()
+    _settings.uv_profile = profile
+
+def scale_to_texel_density(obj, data, face_mask, size_x, size_y, density, profile=None):
+    """Scale the islands touching the masked faces to a texel density
+
+    Args:
+        obj (bpy.types.Object)
+        data (dict): mesh arrays
+        face_mask (array): faces to work on
+        size_x (int or array): image width, or per face width
+        size_y (int or array): image height, or per face height
+        density (float or array): target density, or per face target
+        profile (StageProfile): records the scale and write times
+
     """
 
-    islands = _uvs.get_selected_islands(bm, uv_layer)
+    if profile is None:
+        profile = _profile.StageProfile("Scale To Texel Density")
+    with profile.stage("Scale Islands"):
+        uvs, changed_faces = get_texel_density_uvs(data, face_mask, size_x, size_y, density)
+    if uvs is None:
+        return
 
-    for island in islands:
-        uv_sum = 0
-        vert_sum = 0
-        for face in island:
-            uv_tri = [loop[uv_layer].uv for loop in face.loops]
-            vert_tri = [vert.co for vert in face.verts]
+    # edit meshes are written face by face through bmesh, object mode
+    # meshes with one foreach_set
+    stage = "Write Edit Mesh" if obj.mode == 'EDIT' else "Write Mesh"
+    with profile.stage(stage):
+        _texel.set_mesh_uvs(obj, data, uvs, changed_faces)
+    profile.count(stage, int(changed_faces.sum()))
 
-            uv_area = _uvs.get_area_triangle_uv(
-            uv_tri[0], uv_tri[1], uv_tri[2],
-            uv_image.size[0], uv_image.size[1])
+def get_texel_density_uvs(data, face_mask, size_x, size_y, density):
+    """Loop uvs with the islands touching the masked faces scaled to a texel
+        density, see scale_to_texel_density
 
-            face_area = _uvs.get_area_triangle(
-                vert_tri[0], vert_tri[1], vert_tri[2]
-            )
+    Returns:
+        (uvs, changed face mask), (None, None) when no island is scaled
 
-            uv_sum += math.sqrt(uv_area) * min(uv_image.size[0], uv_image.size[1])
-            vert_sum += math.sqrt(face_area)
+    """
 
-        scale = 0
-        if density > 0 and uv_sum > 0 and vert_sum > 0:
-            scale = density / (uv_sum / vert_sum)
+    labels = _texel.get_uv_island_labels(data)
+    face_area, face_uv_area = _texel.get_face_areas(data)
+    current, area, uv_area = _texel.get_island_density(
+        face_area, face_uv_area, labels, size_x, size_y)
+
+    island_mask = np.zeros(len(current), dtype=bool)
+    island_mask[labels[face_mask]] = True
+    island_mask &= current > 0.0
+    if not island_mask.any():
+        return None, None
+
+    if np.ndim(density):
+        # area weighted target per island
+        weighted = np.bincount(labels, weights=face_area * density, minlength=len(current))
+        target = np.divide(weighted, area, out=np.zeros_like(area), where=area > 0.0)
+        island_mask &= target > 0.0
+    else:
+        target = np.full(len(current), density, dtype=np.float64)
 
-        _uvs.scale_island(me, island, uv_layer, scale, scale)
+    scales = np.ones(len(current), dtype=np.float64)
+    scales[island_mask] = target[island_mask] / current[island_mask]
 
-def get_selected_object_faces():
-	object_faces_indices = {}
+    return _texel.scale_islands(data, labels, scales, island_mask)
 
-	previous_mode = bpy.context.object.mode
+def get_texel_objects(context):
+    """Selected and edited mesh objects that have uvs, one object per mesh
+        so meshes shared by several objects are only measured and scaled once
+    """
+
+    objects = list(context.selected_objects)
+    for obj in getattr(context, "objects_in_mode", None) or []:
+        if obj not in objects:
+            objects.append(obj)
+
+    meshes = set()
+    texel_objects = []
+    for obj in objects:
+        if obj.type != 'MESH' or not obj.data.uv_layers or obj.data in meshes:
+            continue
+        meshes.add(obj.data)
+        texel_objects.append(obj)
+    return texel_objects
+
+def get_texel_image_size(context):
+    """Size of the image in the editor, or the map size setting without one"""
+    image = _uvs.get_current_image()
+    if image is not None and image.size[0] != 0:
+        return image.size[0], image.size[1]
+    size = int(context.scene.betools_settings.map_size_dropdown)
+    return size, size
+
+def measure_islands(objects, size_x, size_y):
+    """Texel density of every uv island of each object
+
+    Returns:
+        list of dicts with the object, its mesh arrays, face island labels and
+        the density and world area per island
 
-	if bpy.context.object.mode == 'EDIT':
-		# Only selected Mesh faces
-		obj = bpy.context.active_object
-		if obj.type == 'MESH' and obj.data.uv_layers:
-			bm = bmesh.from_edit_mesh(obj.data)
-			bm.faces.ensure_lookup_table()
-			object_faces_indices[obj] = [face.index for face in bm.faces if face.select]
-	else:
-		# Selected objects with all faces each
-		selected_objects = [obj for obj in bpy.context.selected_objects]
-		for obj in selected_objects:
-			if obj.type == 'MESH' and obj.data.uv_layers:
-				bpy.ops.object.mode_set(mode='OBJECT')
-				bpy.ops.object.select_all(action='DESELECT')
-				bpy.context.view_layer.objects.active = obj
-				obj.select_set( state = True, view_layer = None)
+    """
 
-				bpy.ops.object.mode_set(mode='EDIT')
-				bm = bmesh.from_edit_mesh(obj.data)
-				bm.faces.ensure_lookup_table()
-				object_faces_indices[obj] = [face.index for face in bm.faces]
+    islands = []
+    for obj in objects:
+        data = _texel.get_mesh_arrays(obj)
+        if data is None:
+            continue
+        labels = _texel.get_uv_island_labels(data)
+        face_area, face_uv_area = _texel.get_face_areas(data)
+        density, area, uv_area = _texel.get_island_density(
+            face_area, face_uv_area, labels, size_x, size_y)
+        islands.append({
+            "object": obj,
+            "data": data,
+            "labels": labels,
+            "density": density,
+            "area": area
+        })
+    return islands
+
+def build_texel_histogram(densities, target, tolerance, bins=_HISTOGRAM_BINS):
+    """Histogram of island densities with the tolerance band around the target"""
+    low = target * (1.0 - tolerance)
+    high = target * (1.0 + tolerance)
+    histogram = {
+        "islands": len(densities),
+        "outliers": int(((densities < low) | (densities > high)).sum()),
+        "low": low,
+        "high": high,
+        "counts": [],
+        "edges": []
+    }
+    if len(densities):
+        counts, edges = np.histogram(densities, bins=bins)
+        histogram["counts"] = counts.tolist()
+        histogram["edges"] = edges.tolist()
+    return histogram
+
+def get_selected_object_faces(objects, profile=None):
+    """Mesh arrays and the faces to work on for each object, the selected
+        faces in edit mode and all faces otherwise. Mesh data is read
+        directly so no mode switching is needed. Objects sharing a mesh are
+        only read once.
+
+    Args:
+        objects (list): mesh objects
+        profile (StageProfile): records the read time of edit and object
+            mode meshes
+
+    Returns:
+        dict of object: (mesh arrays, face mask)
 
-	bpy.ops.object.mode_set(mode=previous_mode)
+    """
 
-	return object_faces_indices
+    if profile is None:
+        profile = _profile.StageProfile("Read Meshes")
+
+    object_faces = {}
+    meshes = set()
+    for obj in objects:
+        if obj.type != 'MESH' or not obj.data.uv_layers or obj.data in meshes:
+            continue
+        meshes.add(obj.data)
+        stage = "Read Edit Mesh" if obj.mode == 'EDIT' else "Read Mesh"
+        with profile.stage(stage):
+            data = _texel.get_mesh_arrays(obj)
+        if data is None:
+            continue
+        profile.count(stage, len(data["loop_start"]))
+        if obj.mode == 'EDIT':
+            face_mask = _texel.get_selected_face_mask(data)
+        else:
+            face_mask = np.ones(len(data["loop_start"]), dtype=bool)
+        object_faces[obj] = (data, face_mask)
+    return object_faces
 
 bpy.utils.register_class(BETOOLS_OT_GetTexel)
 bpy.utils.register_class(BETOOLS_OT_SetTexel)
+bpy.utils.register_class(BETOOLS_OT_SetMaterialTexel)
+bpy.utils.register_class(BETOOLS_OT_TexelHistogram)
+bpy.utils.register_class(BETOOLS_OT_SelectTexelOutliers)
+bpy.utils.register_class(BETOOLS_OT_TexelHeatmap)
 bpy.utils.register_class(BETOOLS_OT_CubeHelper)
 bpy.utils.register_class(BETOOLS_OT_CreateImage)
+bpy.utils.register_class(BETOOLS_OT_BleedImage)
 bpy.utils.register_class(BETOOLS_OT_AssignMat)
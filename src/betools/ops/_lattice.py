@@ -5,8 +5,9 @@
 #################################################################
 
 import bpy
-from mathutils import Vector
+from mathutils import Matrix, Vector
 from .. import _settings
+from ..utils import _bounds
 
 
 class DivideLattice(bpy.types.Operator):
@@ -86,23 +87,11 @@ class Lattice(bpy.types.Operator):
         if selection.mode == 'EDIT':
             bpy.ops.object.mode_set(mode = 'OBJECT')
 
-        vertices = selection.data.vertices
-        vert_positions = [vertex.co @ selection.matrix_world for vertex in vertices]
-        self.rotation = bpy.data.objects[selection.name].rotation_euler
-        self.location = bpy.data.objects[selection.name].location
+        self.rotation = selection.rotation_euler
+        self.location = selection.location
 
-        bb_min = Vector()
-        bb_max = Vector()
-
-        for axis in range(3):
-            pos_list = [pos[axis] for pos in vert_positions]
-            bb_max[axis] = max(pos_list)
-            bb_min[axis] = min(pos_list)
-            
-        #  add location offset
-        bb_max += self.location
-        bb_min += self.location
-        bounding_box = [bb_min, bb_max]
+        bb_min, bb_max, _ = _bounds.get_world_bounds(selection)
+        bounding_box = [Vector(bb_min), Vector(bb_max)]
 
         return bounding_box
 
@@ -119,21 +108,16 @@ class Lattice(bpy.types.Operator):
         # zero out the rotation
         # selection.rotation_euler = (0, 0, 0)
 
-        vertices = selection.data.vertices
-        vert_positions = [vertex.co @ selection.matrix_world for vertex in vertices]
-        self.obj_location = bpy.data.objects[selection.name].location
+        self.obj_location = selection.location
 
-        minimum = Vector()
-        maximum = Vector()
-        
-        for axis in range(3):
-            pos_list = [pos[axis] for pos in vert_positions]
-            maximum[axis] = max(pos_list)
-            minimum[axis] = min(pos_list)
-        center = (maximum + minimum) / 2
-        dimensions = maximum - minimum
+        # bounds in the object's frame, scaled but not rotated, so the
+        # lattice lines up with the object's rotation
+        matrix_world = selection.matrix_world
+        scale = Matrix.Diagonal(matrix_world.to_scale()).to_4x4()
+        minimum, maximum, center = _bounds.get_bounds(_bounds.get_vertex_positions(selection, scale))
+        dimensions = Vector(maximum - minimum)
 
-        self.lattice_location = self.obj_location + center
+        self.lattice_location = matrix_world.to_translation() + matrix_world.to_quaternion() @ Vector(center)
 
         # Create the lattice
         bpy.ops.object.add(type='LATTICE', enter_editmode=False, location=self.lattice_location)
@@ -144,7 +128,7 @@ class Lattice(bpy.types.Operator):
         lattice.data.interpolation_type_v = 'KEY_LINEAR'
         lattice.data.interpolation_type_w = 'KEY_LINEAR'
         lattice.scale = dimensions
-        lattice.rotation_euler = selection.rotation_euler
+        lattice.rotation_euler = matrix_world.to_quaternion().to_euler()
         bpy.context.view_layer.objects.active = selection
         bpy.ops.object.modifier_add(type='LATTICE')
         selection.modifiers["Lattice"].object = lattice
@@ -5,17 +5,15 @@
 
 import bpy
 import bmesh
-from mathutils import Vector
-from bpy.props import EnumProperty
+import numpy as np
+from bpy.props import EnumProperty, FloatProperty
 from ..utils import _uvs
-from ..utils import _mesh
-from ..utils import mode
+from ..utils import _texel
+from ..utils import _trim_image
+from ..utils import _trim_table
 from .. import _settings
 
 
-_DEPTH_THRESHOLD = 0.0001
-
-
 class BETOOLS_OT_AssignTrimTemplate(bpy.types.Operator):
     """Set a template mesh for trim snapping"""
 
@@ -43,14 +41,12 @@ class BETOOLS_OT_AssignTrimTemplate(bpy.types.Operator):
         return True
 
     def execute(self, context):
-        me = bpy.context.object.data
-        bm = bmesh.new()
-        bm.from_mesh(me)
-
         # store the template mesh in scene prefs
         context.scene.betools_settings.trim_mesh = context.active_object.name
-        _settings.trim_slots = _assign_trim_template(bm)
-        if not _settings.trim_slots:
+        context.scene.betools_settings.trim_image = ""
+        table = _trim_table.compile_template(context.active_object)
+        _trim_table.store_trim_table(context.scene, table)
+        if not len(table):
             self.report(
                 {'ERROR_INVALID_INPUT'},
                 "Invalid  template!"
@@ -59,6 +55,68 @@ class BETOOLS_OT_AssignTrimTemplate(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class BETOOLS_OT_DetectTrimSlots(bpy.types.Operator):
+    """Detect trim slots from the trim sheet image"""
+
+    bl_idname = "uv.be_trim_from_image"
+    bl_label = "Trim Slots from Image"
+    bl_description = "Detect the trim slots of the image in the UV editor instead of using a template mesh"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    mode : EnumProperty(
+        name="Mode",
+        items=_trim_image.TRIM_DETECT_MODES,
+        default='GRADIENT')
+
+    threshold : FloatProperty(
+        name="Threshold",
+        description="Color difference counted as an edge",
+        default=0.1,
+        min=0.0,
+        max=1.0)
+
+    coverage : FloatProperty(
+        name="Coverage",
+        description="Part of a row or column that must be an edge to split the sheet there",
+        default=0.9,
+        min=0.0,
+        max=1.0)
+
+    min_size : FloatProperty(
+        name="Min Size",
+        description="Smallest trim side, relative to the image size",
+        default=0.01,
+        min=0.0,
+        max=1.0)
+
+    @classmethod
+    def poll(cls, context):
+        if _settings.edit_pivot_mode:
+            return False
+        if bpy.context.area.type != 'IMAGE_EDITOR':
+            return False
+        image = context.space_data.image
+        if image is None or image.size[0] == 0:
+            return False
+        return True
+
+    def execute(self, context):
+        image = context.space_data.image
+        table = _trim_table.compile_image(image, self.mode, self.threshold, self.coverage, self.min_size)
+        if not len(table):
+            self.report({'ERROR_INVALID_INPUT'}, "No trims found in {}!".format(image.name))
+            return {'FINISHED'}
+
+        context.scene.betools_settings.trim_image = image.name
+        context.scene.betools_settings.trim_mesh = ""
+        _trim_table.store_trim_table(context.scene, table)
+        # materials using the sheet as their template follow the new settings
+        if _trim_table.has_library_table(context.scene, image.name):
+            _trim_table.store_library_table(context.scene, table)
+        self.report({'INFO'}, "{} trims found".format(len(table)))
+        return {'FINISHED'}
+
+
 class BETOOLS_OT_TrimFit(bpy.types.Operator):
     """Set a template mesh for trim snapping"""
 
@@ -93,14 +151,6 @@ class BETOOLS_OT_TrimFit(bpy.types.Operator):
         uv_layer = bm.loops.layers.uv.verify()
         uvs = _uvs.get_selected_uvs(bm, uv_layer)
 
-        template_mesh = bpy.data.objects[context.scene.betools_settings.trim_mesh]
-        bm_template = bmesh.new()
-        bm_template.from_mesh(template_mesh.data)
-
-        # reassign if it's a new scene
-        if not _settings.trim_slots:
-            _settings.trim_slots = _assign_trim_template(bm_template)
-
         fit_mode = context.scene.betools_settings.trim_fit_dropdown
 
         _uvs.store_selection()
@@ -112,11 +162,16 @@ class BETOOLS_OT_TrimFit(bpy.types.Operator):
             return {'FINISHED'}
 
         island = islands[0]
+        trim_table = _trim_table.get_material_trim_table(context, get_island_material(obj, island))
+        if not trim_table:
+            self.report({'ERROR_INVALID_INPUT'}, "Assign a trim template!")
+            return {'FINISHED'}
+
         # determine if the shell needs rotated
         island_bounding_box = _uvs.get_island_bounding_box(island, uv_layer)
         if island_bounding_box["height"] > island_bounding_box["width"]:
             _uvs.rotate_island(bm, [island], uv_layer, 90.0)
-        trim_match = find_matching_trim(bm, island_bounding_box, _settings.trim_slots)
+        trim_match = find_matching_trim(bm, island_bounding_box, trim_table)
         if fit_mode == 'VERTICAL':
             vertical_snap(bm, uv_layer, uvs, island, island_bounding_box, trim_match)
         elif fit_mode == 'HORIZONTAL':
@@ -131,6 +186,58 @@ class BETOOLS_OT_TrimFit(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class BETOOLS_OT_TrimFitBatch(bpy.types.Operator):
+    """Snap every selected UV shell to its closest trim"""
+
+    bl_idname = "uv.be_trim_fit_batch"
+    bl_label = "Trim Fit All"
+    bl_description = "Snap all selected UV shells of the edited objects to their closest trims"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        if _settings.edit_pivot_mode:
+            return False
+        if not bpy.context.active_object:
+            return False
+        if not bpy.context.object.mode == 'EDIT':
+            return False
+        if bpy.context.scene.tool_settings.use_uv_select_sync:
+            return False
+        if bpy.context.area.type != 'IMAGE_EDITOR':
+            return False
+        return True
+
+    def execute(self, context):
+        settings = context.scene.betools_settings
+
+        # bounds of every selected island across the edited objects
+        shells = []
+        for obj in context.objects_in_mode:
+            if obj.type != 'MESH' or not obj.data.uv_layers:
+                continue
+            shell = get_selected_shells(obj)
+            if shell is not None:
+                shells.append(shell)
+
+        if not shells:
+            self.report({'ERROR_INVALID_INPUT'}, "Select UV shells!")
+            return {'FINISHED'}
+
+        def fit(trim_table, island_min, island_max):
+            return _trim_table.fit_islands(
+                trim_table, island_min, island_max,
+                settings.trim_fit_dropdown, settings.trim_layout_dropdown)
+
+        fitted, trims = fit_shells(context, shells, fit)
+        if not fitted:
+            self.report({'ERROR_INVALID_INPUT'}, "Assign a trim template!")
+            return {'FINISHED'}
+
+        self.report({'INFO'}, "{} shells snapped to {} trims".format(fitted, trims))
+        return {'FINISHED'}
+
+
 class BETOOLS_OT_ShiftTrimShell(bpy.types.Operator):
     """Set a template mesh for trim snapping"""
 
@@ -144,7 +251,9 @@ class BETOOLS_OT_ShiftTrimShell(bpy.types.Operator):
         default="DOWN",
         items=[
             ('UP', "Up", "Shift trim shell up"),
-            ('DOWN', "Down", "Shift trim shell down")
+            ('DOWN', "Down", "Shift trim shell down"),
+            ('LEFT', "Left", "Shift trim shell left"),
+            ('RIGHT', "Right", "Shift trim shell right")
         ]
     )
 
@@ -167,53 +276,29 @@ class BETOOLS_OT_ShiftTrimShell(bpy.types.Operator):
         return True
 
     def execute(self, context):
-        obj = bpy.context.active_object
-        me = obj.data
-        bm = bmesh.from_edit_mesh(me)
-        uv_layer = bm.loops.layers.uv.verify()
-        uvs = _uvs.get_selected_uvs(bm, uv_layer)
-
-        template_mesh = bpy.data.objects[context.scene.betools_settings.trim_mesh]
-        bm_template = bmesh.new()
-        bm_template.from_mesh(template_mesh.data)
-
-        _uvs.store_selection()
-        islands = _uvs.get_selected_islands(bm, uv_layer)
-        _uvs.restore_selection(bm, uv_layer)
+        shells = []
+        for obj in context.objects_in_mode:
+            if obj.type != 'MESH' or not obj.data.uv_layers:
+                continue
+            shell = get_selected_shells(obj, rotate=False)
+            if shell is not None:
+                shells.append(shell)
 
-        if len(islands) != 1:
-            self.report({'ERROR_INVALID_INPUT'}, "Select one UV shell!")
+        if not shells:
+            self.report({'ERROR_INVALID_INPUT'}, "Select UV shells!")
             return {'FINISHED'}
 
         fit_mode = context.scene.betools_settings.trim_fit_dropdown
 
-        island = islands[0]
-        # determine if the shell needs rotated
-        island_bounding_box = _uvs.get_island_bounding_box(island, uv_layer)
-
-        # get the current 'slot' by testing if the bbox min is in an existing slot
-        current_trim_slot = get_selected_island_trim_index(island_bounding_box, _settings.trim_slots)
-        direction = -1 if self.direction == 'UP' else 1
-
-        next_trim_slot = current_trim_slot + direction
-
-        if next_trim_slot > len(_settings.trim_slots) - 1:
-            next_trim_slot = 0
-        elif next_trim_slot < 0:
-            next_trim_slot = len(_settings.trim_slots) - 1
-
-        trim_match = _settings.trim_slots[next_trim_slot]
+        def fit(trim_table, island_min, island_max):
+            slots = trim_table.shift_islands(island_min, island_max, self.direction)
+            scale, target_min = _trim_table.fit_to_slots(trim_table, slots, island_min, island_max, fit_mode)
+            return slots, scale, target_min
 
-        if fit_mode == 'VERTICAL':
-            vertical_snap(bm, uv_layer, uvs, island, island_bounding_box, trim_match)
-        elif fit_mode == 'HORIZONTAL':
-            horizontal_snap(bm, uv_layer, uvs, island, island_bounding_box, trim_match)
-        elif fit_mode == 'VERTICAL_FIT':
-            vertical_fit_snap(bm, uv_layer, uvs, island, island_bounding_box, trim_match)
-        elif fit_mode == 'HORIZONTAL_FIT':
-            horizontal_fit_snap(bm, uv_layer, uvs, island, island_bounding_box, trim_match)
-        else:
-            best_fit_snap(bm, uv_layer, uvs, island, island_bounding_box, trim_match)
+        fitted, trims = fit_shells(context, shells, fit)
+        if not fitted:
+            self.report({'ERROR_INVALID_INPUT'}, "Assign a trim template!")
+            return {'FINISHED'}
 
         return {'FINISHED'}
 
@@ -263,13 +348,6 @@ class BETOOLS_OT_AlignTrimShell(bpy.types.Operator):
         uv_layer = bm.loops.layers.uv.verify()
         uvs = _uvs.get_selected_uvs(bm, uv_layer)
 
-        template_mesh = bpy.data.objects[context.scene.betools_settings.trim_mesh]
-        bm_template = bmesh.new()
-        bm_template.from_mesh(template_mesh.data)
-
-        if not _settings.trim_slots:
-            _settings.trim_slots = _assign_trim_template(bm_template)
-
         _uvs.store_selection()
         islands = _uvs.get_selected_islands(bm, uv_layer)
         _uvs.restore_selection(bm, uv_layer)
@@ -279,10 +357,15 @@ class BETOOLS_OT_AlignTrimShell(bpy.types.Operator):
             return {'FINISHED'}
 
         island = islands[0]
+        trim_table = _trim_table.get_material_trim_table(context, get_island_material(obj, island))
+        if not trim_table:
+            self.report({'ERROR_INVALID_INPUT'}, "Assign a trim template!")
+            return {'FINISHED'}
+
         island_bounding_box = _uvs.get_island_bounding_box(island, uv_layer)
 
-        current_trim_slot = get_selected_island_trim_index(island_bounding_box, _settings.trim_slots)
-        trim_slot = _settings.trim_slots[current_trim_slot]
+        current_trim_slot = get_selected_island_trim_index(island_bounding_box, trim_table)
+        trim_slot = trim_table.slots[current_trim_slot]
 
         # align left = -min.x
         if self.mode == "LEFT":
@@ -299,157 +382,163 @@ class BETOOLS_OT_AlignTrimShell(bpy.types.Operator):
 
         return {'FINISHED'}
 
-@mode.edit_mode
-def _assign_trim_template(template_mesh):
-
-    template_mesh.transform(bpy.context.object.matrix_world)
-    bounding_box = _mesh.get_mesh_bounding_box(template_mesh)  # min and max for mapping 0-1 uv space
-
-    # print("Bounding box: ")
-    # print(bounding_box)
-
-    # TODO get a sorted flat list
-    # TODO round to the near something float
-    # TODO after flat list sorted by y (z) then work on row sorting
-   
-    face_list = list(template_mesh.faces)
-    # column = []
-
-    face_bounding_boxes = []
-
-    for face in template_mesh.faces:
-        face_bounding_boxes.append(_mesh.get_face_bounding_box(face))
-
-        """
-        for vert in face.verts:
-            # get all verts that match bbox min (enforce x min for now)
-            # if vert.co.x == bounding_box["min"].x:
-            if vert.co.x == bounding_box["min"].x:
-                # we have a left most face
-                face_bounding_boxes.append(_mesh.get_face_bounding_box(face))
-                face_list.remove(face)
-                # column_face = True  # should be row face NOTE
-                break
-        """
-
-    # sort by max z to build vertical order (3D space)
-    sorted_bounds = sorted(face_bounding_boxes, key=_sort_max_z, reverse=True)
-    
-    """
-    column_unsorted_rows = []
-
-    # if there are still unsorted faces
-    for row in sorted_column:
-        # get the row's height (z) min and max
-        # target_bounding_box = get_face_bounding_box(row)
-        # turn the row into a list so faces can be added, single faced rows are ok
-        temp_row = [row]
-        for face in face_list:
-            face_bounding_box = _mesh.get_face_bounding_box(face)
-            # look for faces with matching height (z) values
-            if face_bounding_box["min"].z == row["min"].z and face_bounding_box["max"].z == row["max"].z:
-                temp_row.append(face_bounding_box)
-                continue
-        column_unsorted_rows.append(temp_row)
-
-    column_rows_sorted = column_unsorted_rows
-
-    uv_trim_faces = []
-    for row in column_rows_sorted:
-        for face_bounds in sorted(row, key=_sort_min_z):
-            uv_bounds = face_to_uv_shell(bounding_box, face_bounds)
-            if not uv_bounds:
-                # invalid input
-                return None
-            uv_trim_faces.append(uv_bounds)
-    """
-
-    uv_trim_faces = []
-
-    for face_bounds in sorted_bounds:
-        uv_bounds = face_to_uv_shell(bounding_box, face_bounds)
-        if not uv_bounds:
-            continue
-        uv_trim_faces.append(uv_bounds)
-
-    print(len(uv_trim_faces))
-
-    return uv_trim_faces
-
-def _sort_max_z(item):
-    return item["max"].z
+def find_matching_trim(bm, island_bounding_box, trim_table):
+    """Find the closest sized trim slot"""
 
-def _sort_min_x(item):
-    return item["min"].x
+    if not trim_table:
+        print("No trim slots assigned!")
+        return
 
-def _sort_min_z(item):
-    return item["min"].z
+    # width to height ratio
+    island_ratio = island_bounding_box["width"] / island_bounding_box["height"]
+    return trim_table.slots[trim_table.match_ratio(island_ratio)]
 
-def face_to_uv_shell(mesh_bounding_box, face_bounding_box):
-    """Return the UV space representation of the 3D face coordinates.
-        Meant for use in trim sheets or other instances where a square
-        plane is mapped to UV space.
+def get_island_material(obj, island):
+    """Material of the island's first face"""
+    index = island[0].material_index
+    if index < len(obj.material_slots):
+        return obj.material_slots[index].material
+    return None
 
-    Args:
-        bounding_box (dict): Face bounding box where x coords are zero
+def get_selected_shells(obj, rotate=True):
+    """Selected uv islands of an object with their bounds, tall islands are
+        turned 90 degrees so their long side runs along the trim
+        unless rotate is off
 
     Returns:
-        dict
+        dict or None when nothing is selected
 
     """
 
-    if (mesh_bounding_box['max'].y - mesh_bounding_box['min'].y) > _DEPTH_THRESHOLD:
+    data = _texel.get_mesh_arrays(obj)
+    if data is None:
         return None
-
-    if (face_bounding_box['max'].y - face_bounding_box['min'].y) > _DEPTH_THRESHOLD:
+    face_mask = _texel.get_selected_face_mask(data)
+    if not face_mask.any():
         return None
 
-    scalar = 1.000000 / (mesh_bounding_box['max'].x - mesh_bounding_box['min'].x)
-    x_offset = abs(mesh_bounding_box['min'].x)
-    z_offset = abs(mesh_bounding_box['min'].z)
-
-    # coords + min so things will scale correctly
-    x_min = (x_offset + face_bounding_box['min'].x) * scalar
-    y_min = (z_offset + face_bounding_box['min'].z) * scalar # y in uv space, z in 3D
-
-    x_max = (x_offset + face_bounding_box['max'].x) * scalar
-    y_max = (z_offset + face_bounding_box['max'].z) * scalar
-
-    width = x_max - x_min
-    height = y_max - y_min
-    area = width * height
-    center = Vector((x_min + width/2.0, y_min + width/2.0))
-
-    # face to uv bounds
-    uv_bounds = {
-        "min": Vector((x_min, y_min)),
-        "max": Vector((x_max, y_max)),
-        "width": width,
-        "height": height,
-        "area": area,
-        "center": center
+    labels = _texel.get_uv_island_labels(data)
+    island_count = int(labels.max()) + 1
+    selected = np.bincount(labels, weights=face_mask, minlength=island_count) > 0.0
+
+    # compact the selected islands to 0 - count
+    island_index = np.full(island_count, -1, dtype=np.int64)
+    island_index[selected] = np.arange(selected.sum())
+    loop_islands = island_index[labels[data["loop_faces"]]]
+    loop_mask = loop_islands >= 0
+    loop_islands = loop_islands[loop_mask]
+
+    uvs = data["uvs"].copy()
+    shell_min, shell_max = _get_bounds(uvs[loop_mask], loop_islands, selected.sum())
+
+    # clockwise quarter turn around the center, as _uvs.rotate_island
+    size = shell_max - shell_min
+    tall = size[:, 1] > size[:, 0]
+    if rotate and tall.any():
+        center = (shell_min + shell_max) * 0.5
+        pivot = center[loop_islands]
+        offset = uvs[loop_mask] - pivot
+        turned = np.column_stack((offset[:, 1], -offset[:, 0])) + pivot
+        uvs[loop_mask] = np.where(tall[loop_islands][:, None], turned, uvs[loop_mask])
+        shell_min, shell_max = _get_bounds(uvs[loop_mask], loop_islands, selected.sum())
+
+    # material of each island, from its first face
+    face_count = len(labels)
+    first_faces = np.full(island_count, face_count, dtype=np.int64)
+    np.minimum.at(first_faces, labels, np.arange(face_count))
+    slots = obj.material_slots
+    materials = [
+        slots[index].material if index < len(slots) else None
+        for index in data["face_materials"][first_faces[selected]].tolist()]
+
+    return {
+        "object": obj,
+        "data": data,
+        "uvs": uvs,
+        "loop_mask": loop_mask,
+        "loop_islands": loop_islands,
+        "face_mask": selected[labels],
+        "materials": materials,
+        "min": shell_min,
+        "max": shell_max
     }
 
-    return uv_bounds
+def _get_bounds(uvs, labels, count):
+    bounds_min = np.full((count, 2), np.inf)
+    bounds_max = np.full((count, 2), -np.inf)
+    np.minimum.at(bounds_min, labels, uvs)
+    np.maximum.at(bounds_max, labels, uvs)
+    return bounds_min, bounds_max
 
-def find_matching_trim(bm, island_bounding_box, trim_slots):
-    """Find the closest sized trim slot"""
+def fit_shells(context, shells, fit):
+    """Fit the selected islands of all shells with the trim table of their
+        material and write each object once. Islands without a table keep
+        their place.
 
-    if not trim_slots:
-        print("No trim slots assigned!")
-        return
+    Args:
+        shells (list): get_selected_shells results
+        fit (function): (table, island min, island max) to
+            (slots, scale, target min), for the islands of one table
 
-    # width to height ratio
-    match = trim_slots[0]
-    match_ratio = match["width"] / match["height"]
-    island_ratio = island_bounding_box["width"] / island_bounding_box["height"]
+    Returns:
+        (fitted island count, used trim count)
 
-    for trim in trim_slots:
-        current_slot_ratio = trim["width"] / trim["height"]
-        if abs(island_ratio - current_slot_ratio) < abs(island_ratio - match_ratio):
-            match = trim
-            match_ratio = trim["width"] / trim["height"]
-    return match
+    """
+
+    island_min = np.concatenate([shell["min"] for shell in shells])
+    island_max = np.concatenate([shell["max"] for shell in shells])
+
+    # group the islands by the library table of their material
+    tables = []
+    material_tables = {}
+    table_index = []
+    for shell in shells:
+        for material in shell["materials"]:
+            if material not in material_tables:
+                table = _trim_table.get_material_trim_table(context, material)
+                if table not in tables:
+                    tables.append(table)
+                material_tables[material] = tables.index(table)
+            table_index.append(material_tables[material])
+    table_index = np.array(table_index, dtype=np.int64)
+
+    scale = np.ones_like(island_min)
+    target_min = island_min.copy()
+    fitted_mask = np.zeros(len(island_min), dtype=bool)
+    fitted = 0
+    trims = 0
+    for index, table in enumerate(tables):
+        mask = table_index == index
+        if not table or not mask.any():
+            continue
+        slots, scale[mask], target_min[mask] = fit(table, island_min[mask], island_max[mask])
+        fitted_mask |= mask
+        fitted += int(mask.sum())
+        trims += len(np.unique(slots))
+
+    if fitted:
+        start = 0
+        for shell in shells:
+            end = start + len(shell["min"])
+            if fitted_mask[start:end].any():
+                apply_shell_fits(
+                    shell, island_min[start:end], scale[start:end], target_min[start:end], fitted_mask[start:end])
+            start = end
+    return fitted, trims
+
+def apply_shell_fits(shell, island_min, scale, target_min, fitted_mask):
+    """Move the shells of one object to their trims in a single write.
+        Islands outside fitted_mask get their original uvs back, undoing
+        the quarter turn of get_selected_shells.
+    """
+
+    uvs = shell["uvs"]
+    loop_mask = shell["loop_mask"]
+    loop_islands = shell["loop_islands"]
+    fitted = (uvs[loop_mask] - island_min[loop_islands]) * scale[loop_islands] + target_min[loop_islands]
+    original = shell["data"]["uvs"][loop_mask]
+    uvs[loop_mask] = np.where(fitted_mask[loop_islands][:, None], fitted, original)
+    _texel.set_mesh_uvs(shell["object"], shell["data"], uvs, shell["face_mask"])
 
 def get_vertical_scalar(trim_slot, island_bounding_box):
     """Get the scalar needed to fit the uv island to the trim slot"""
@@ -546,34 +635,24 @@ def best_fit_snap(bm, uv_layer, uvs, island, island_bounding_box, trim_match):
     v_delta = trim_match["min"].y - island_bounding_box["min"].y
     _uvs.translate_uvs(bm, uv_layer, uvs, u_delta, v_delta)
 
-def get_selected_island_trim_index(island_bounding_box, sorted_trim_slots):
-    """Get the index based on the trim slots"""
-
-    for i, trim in enumerate(sorted_trim_slots):
-        if island_bounding_box["min"].x >= trim["min"].x and island_bounding_box["min"].x < trim["max"].x:
-            if island_bounding_box["min"].y >= trim["min"].y and island_bounding_box["min"].y < trim["max"].y:
-                return i
-    return -1
-
-def get_next_island_trim_index(current_index, direction, trim_slots):
-    """Get the next trim slot"""
-    trim_slots = sorted(trim_slots, key=lambda d:d["min"].x)
+def get_selected_island_trim_index(island_bounding_box, trim_table):
+    """Get the index of the trim slot holding the island's min corner"""
+    return trim_table.slot_at(island_bounding_box["min"].x, island_bounding_box["min"].y)
 
-    if current_index + direction < 0:
-        current_index = len(trim_slots) - 1
-    elif current_index + direction > len(trim_slots) - 1:
-        current_index = 0
-    else:
-        current_index += direction
+def get_next_island_trim_index(current_index, direction, trim_table):
+    """Get the next trim slot along u, using the table's presorted order"""
+    current_index = trim_table.step_by_u(current_index, direction)
 
     new_slot = {
-        "trim": trim_slots[current_index],
+        "trim": trim_table.slots[current_index],
         "index": current_index
     }
     return new_slot
 
 
 bpy.utils.register_class(BETOOLS_OT_AssignTrimTemplate)
+bpy.utils.register_class(BETOOLS_OT_DetectTrimSlots)
 bpy.utils.register_class(BETOOLS_OT_TrimFit)
+bpy.utils.register_class(BETOOLS_OT_TrimFitBatch)
 bpy.utils.register_class(BETOOLS_OT_ShiftTrimShell)
 bpy.utils.register_class(BETOOLS_OT_AlignTrimShell)
@@ -5,15 +5,19 @@
 
 import bpy
 import bmesh
+from bpy_extras.io_utils import ExportHelper
 from collections import defaultdict
 from math import radians, hypot
-from timeit import default_timer as timer
+from ..utils import _chain
+from ..utils import _profile
+from ..utils import _ui
+from .. import _settings
 
 
 precision = 3
 
 
-def main(context, operator, square = False, snapToClosest = False):
+def main(context, operator, square = False, snapToClosest = False, edgeLength = False):
     if context.scene.tool_settings.use_uv_select_sync:
         operator.report({'ERROR'}, "Please disable 'Keep UV and edit mesh in sync'")
         # context.scene.tool_settings.use_uv_select_sync = False
@@ -23,30 +27,35 @@ def main(context, operator, square = False, snapToClosest = False):
     if (context.edit_object not in selected_objects):
         selected_objects.append(context.edit_object)
 
+    profile = _profile.StageProfile("Squarify" if square else "Rectify")
+    editor = _ui.get_uv_editor(context)
     for obj in selected_objects:
         if (obj.type == "MESH"):
-            main1(obj, context, operator, square, snapToClosest)
+            main1(obj, context, operator, square, snapToClosest, profile, editor, edgeLength)
 
-def main1(obj, context, operator, square, snapToClosest):
+    profile.finish()
+    _settings.uv_profile = profile
+
+def main1(obj, context, operator, square, snapToClosest, profile, editor, edgeLength = False):
     if context.scene.tool_settings.use_uv_select_sync:
         operator.report({'ERROR'}, "Please disable 'Keep UV and edit mesh in sync'")
         # context.scene.tool_settings.use_uv_select_sync = False
         return
 
-    startTime = timer()
     me = obj.data
     bm = bmesh.from_edit_mesh(me)
     uv_layer = bm.loops.layers.uv.verify()
     # bm.faces.layers.tex.verify()  # currently blender needs both layers.
 
-    edgeVerts, filteredVerts, selFaces, nonQuadFaces, vertsDict, noEdge = ListsOfVerts(uv_layer, bm)
+    with profile.stage("Gather Verts"):
+        edgeVerts, filteredVerts, selFaces, nonQuadFaces, vertsDict, noEdge = ListsOfVerts(uv_layer, bm)
 
     if len(filteredVerts) is 0: return
     if len(filteredVerts) is 1:
         SnapCursorToClosestSelected(filteredVerts)
         return
 
-    cursorClosestTo = CursorClosestTo(filteredVerts)
+    cursorClosestTo = CursorClosestTo(filteredVerts, editor)
     #line is selected
 
     if len(selFaces) is 0:
@@ -54,14 +63,26 @@ def main1(obj, context, operator, square, snapToClosest):
             SnapCursorToClosestSelected(filteredVerts)
             return
 
-        VertsDictForLine(uv_layer, bm, filteredVerts, vertsDict)
+        with profile.stage("Gather Line"):
+            chain = _chain.get_selected_uv_chain(bm, uv_layer)
+
+        with profile.stage("Straighten Line"):
+            straightened = StraightenUVChain(chain, cursorClosestTo, 'LENGTH' if edgeLength else 'EVEN')
+        if straightened:
+            return SuccessFinished(me, profile)
+
+        # branching or closed selections fall back to the axis sort
+        with profile.stage("Gather Line"):
+            VertsDictForLine(uv_layer, bm, filteredVerts, vertsDict)
 
         if AreVectsLinedOnAxis(filteredVerts) is False:
-            ScaleTo0OnAxisAndCursor(filteredVerts, vertsDict, cursorClosestTo)
-            return SuccessFinished(me, startTime)
+            with profile.stage("Flatten Line"):
+                ScaleTo0OnAxisAndCursor(filteredVerts, vertsDict, cursorClosestTo)
+            return SuccessFinished(me, profile)
 
-        MakeEqualDistanceBetweenVertsInLine(filteredVerts, vertsDict, cursorClosestTo)
-        return SuccessFinished(me, startTime)
+        with profile.stage("Equalize Line"):
+            MakeEqualDistanceBetweenVertsInLine(filteredVerts, vertsDict, cursorClosestTo)
+        return SuccessFinished(me, profile)
 
     # deselect non quads
     for nf in nonQuadFaces:
@@ -100,13 +121,16 @@ def main1(obj, context, operator, square, snapToClosest):
             toCheck.difference_update(island)
         return islands
 
-    islands = getIslandsFromSelectedFaces(selFaces)
+    with profile.stage("Find Islands"):
+        islands = getIslandsFromSelectedFaces(selFaces)
 
     def main2 (targetFace, faces):
-        ShapeFace(uv_layer, operator, targetFace, vertsDict, square)
+        with profile.stage("Shape Face"):
+            ShapeFace(uv_layer, operator, targetFace, vertsDict, square, editor)
 
-        if square: FollowActiveUV(operator, me, targetFace, faces, 'EVEN')
-        else: FollowActiveUV(operator, me, targetFace, faces)
+        with profile.stage("Follow Active"):
+            if square: FollowActiveUV(operator, me, targetFace, faces, 'EVEN')
+            else: FollowActiveUV(operator, me, targetFace, faces)
 
     for island in islands:
         targetFace = bm.faces.active
@@ -121,13 +145,14 @@ def main1(obj, context, operator, square, snapToClosest):
 
     if noEdge is False:
         #edge has ripped so we connect it back
-        for ev in edgeVerts:
-            key = (round(ev.uv.x, precision), round(ev.uv.y, precision))
-            if key in vertsDict:
-                ev.uv = vertsDict[key][0].uv
-                ev.select = True
+        with profile.stage("Reconnect Edges"):
+            for ev in edgeVerts:
+                key = (round(ev.uv.x, precision), round(ev.uv.y, precision))
+                if key in vertsDict:
+                    ev.uv = vertsDict[key][0].uv
+                    ev.select = True
 
-    return SuccessFinished(me, startTime)
+    return SuccessFinished(me, profile)
 
 '''def ScaleSelection(factor, pivot = 'CURSOR'):
     last_pivot = bpy.context.space_data.pivot_point
@@ -136,7 +161,7 @@ def main1(obj, context, operator, square, snapToClosest):
     bpy.context.space_data.pivot_point = last_pivot
     return'''
 
-def ShapeFace(uv_layer, operator, targetFace, vertsDict, square):
+def ShapeFace(uv_layer, operator, targetFace, vertsDict, square, editor = None):
     corners = []
     for l in targetFace.loops:
         luv = l[uv_layer]
@@ -148,12 +173,12 @@ def ShapeFace(uv_layer, operator, targetFace, vertsDict, square):
 
     lucv, ldcv, rucv, rdcv = Corners(corners)
 
-    cct = CursorClosestTo([lucv, ldcv, rdcv, rucv])
-    MakeUvFaceEqualRectangle(vertsDict, lucv, rucv, rdcv, ldcv, cct, square)
+    cct = CursorClosestTo([lucv, ldcv, rdcv, rucv], editor)
+    MakeUvFaceEqualRectangle(vertsDict, lucv, rucv, rdcv, ldcv, cct, square, editor)
     return
 
-def MakeUvFaceEqualRectangle(vertsDict, lucv, rucv, rdcv, ldcv, startv, square = False):
-    sizeX, sizeY = ImageSize()
+def MakeUvFaceEqualRectangle(vertsDict, lucv, rucv, rdcv, ldcv, startv, square = False, editor = None):
+    sizeX, sizeY = ImageSize(editor)
     ratio = sizeX/sizeY
 
     if startv is None: startv = lucv.uv
@@ -271,9 +296,7 @@ def ListsOfVerts(uv_layer, bm):
         edgeVerts.extend(allEdgeVerts)
 
     if len(selFaces) is 0:
-        for ev in edgeVerts:
-            if ListQuasiContainsVect(filteredVerts, ev) is False:
-                filteredVerts.append(ev)
+        filteredVerts = FilterQuasiEqualVerts(edgeVerts)
     else: filteredVerts = edgeVerts
 
     return edgeVerts, filteredVerts, selFaces, nonQuadFaces, vertsDict, noEdge
@@ -284,6 +307,26 @@ def ListQuasiContainsVect(list, vect):
             return True
     return False
 
+def FilterQuasiEqualVerts(verts, allowedError = 0.00001):
+    """Keep the first of the verts that are AreVertsQuasiEqual, like a
+        ListQuasiContainsVect test per vert. Kept verts are bucketed in a
+        grid of allowedError cells so only the neighbouring cells are
+        compared instead of the whole list.
+    """
+    filtered = []
+    grid = defaultdict(list)
+    for v in verts:
+        cellX = int(v.uv.x // allowedError)
+        cellY = int(v.uv.y // allowedError)
+        if any(AreVertsQuasiEqual(kept, v, allowedError)
+               for x in (cellX - 1, cellX, cellX + 1)
+               for y in (cellY - 1, cellY, cellY + 1)
+               for kept in grid.get((x, y), ())):
+            continue
+        grid[(cellX, cellY)].append(v)
+        filtered.append(v)
+    return filtered
+
 #modified ideasman42's uvcalc_follow_active.py
 def FollowActiveUV(operator, me, f_act, faces, EXTEND_MODE = 'LENGTH_AVERAGE'):
     bm = bmesh.from_edit_mesh(me)
@@ -457,13 +500,12 @@ def FollowActiveUV(operator, me, f_act, faces, EXTEND_MODE = 'LENGTH_AVERAGE'):
 
 '''----------------------------------'''
 
-def SuccessFinished(me, startTime):
+def SuccessFinished(me, profile):
     #use for backtrack of steps
     #bpy.ops.ed.undo_push()
-    bmesh.update_edit_mesh(me)
-    elapsed = round(timer()-startTime, 2)
-    #if (elapsed >= 0.05): operator.report({'INFO'}, "UvSquares finished, elapsed:", elapsed, "s.")
-    if (elapsed >= 0.05): print("UvSquares finished, elapsed:", elapsed, "s.")
+    with profile.stage("Update Mesh"):
+        bmesh.update_edit_mesh(me)
+    profile.finish()
     return
 
 '''def SymmetrySelected(axis, pivot = "MEDIAN"):
@@ -555,6 +597,40 @@ def MakeEqualDistanceBetweenVertsInLine(filteredVerts, vertsDict, startv = None)
             currentY = currentY - finalScale
     return
 
+def StraightenUVChain(chain, startv = None, mode = 'EVEN'):
+    """Lay an ordered chain of selected uvs on a horizontal or vertical line
+        in one pass. Spacing is even or follows the 3D edge lengths ('LENGTH').
+        Returns False if the selection isn't a single open path.
+    """
+    ordered = _chain.order_chain(chain["edges"], len(chain["loops"]))
+    if ordered is None:
+        return False
+    order, edge_order = ordered
+
+    points = chain["points"][order]
+    segment_lengths = chain["lengths"][edge_order] if mode == 'LENGTH' else None
+
+    # start from the end closest to the cursor
+    if startv is not None and AreVertsQuasiEqual(startv, chain["loops"][order[-1]][0]):
+        order = order[::-1]
+        points = points[::-1]
+        if segment_lengths is not None:
+            segment_lengths = segment_lengths[::-1]
+
+    start = points[0]
+    end = points[-1].copy()
+    delta = end - start
+    if abs(delta[0]) >= abs(delta[1]):
+        end[1] = start[1]
+    else:
+        end[0] = start[0]
+
+    positions = _chain.straighten_chain(start, end, len(order), segment_lengths)
+    for node, uv in zip(order.tolist(), positions.tolist()):
+        for luv in chain["loops"][node]:
+            luv.uv = uv
+    return True
+
 def VertsDictForLine(uv_layer, bm, selVerts, vertsDict):
     for f in bm.faces:
         for l in f.loops:
@@ -659,31 +735,34 @@ def Corners(corners):
 
     return leftUp, leftDown, rightUp, rightDown
 
-def ImageSize():
-    ratioX, ratioY = 256,256
-    for a in bpy.context.screen.areas:
-        if a.type == 'IMAGE_EDITOR':
-            img = a.spaces[0].image
-            if img is not None and img.size[0] is not 0:
-                ratioX, ratioY = img.size[0], img.size[1]
-            break
-    return ratioX, ratioY
+def ImageSize(editor = None):
+    if editor is None:
+        editor = _ui.get_uv_editor()
+    if editor is None:
+        return 256, 256
+    return editor.image_size
 
-def CursorClosestTo(verts):
-    sizeX, sizeY = ImageSize()
-    if bpy.app.version >= (2, 80, 0):
-        sizeX, sizeY = 1,1
-    min = float('inf')
+def CursorClosestTo(verts, editor = None):
     minV = verts[0]
+    if editor is None:
+        editor = _ui.get_uv_editor()
+    if editor is None:
+        return minV
+
+    sizeX, sizeY = 1, 1
+    if bpy.app.version < (2, 80, 0):
+        sizeX, sizeY = editor.image_size
+    # resolve the cursor once instead of per vert
+    locX = editor.cursor.x / sizeX
+    locY = editor.cursor.y / sizeY
+
+    min = float('inf')
     for v in verts:
         if v is None: continue
-        for area in bpy.context.screen.areas:
-            if area.type == 'IMAGE_EDITOR':
-                loc = area.spaces[0].cursor_location
-                hyp = hypot(loc.x/sizeX -v.uv.x, loc.y/sizeY -v.uv.y)
-                if (hyp < min):
-                    min = hyp
-                    minV = v
+        hyp = hypot(locX - v.uv.x, locY - v.uv.y)
+        if (hyp < min):
+            min = hyp
+            minV = v
     return minV
 
 def SetAll2dCursorsTo(x,y):
@@ -721,7 +800,8 @@ def AreVertsQuasiEqual(v1, v2, allowedError = 0.00001):
     return False
 
 def RipUvFaces(context, operator):
-    startTime = timer()
+    profile = _profile.StageProfile("Rip Faces")
+    _settings.uv_profile = profile
 
     obj = context.active_object
     me = obj.data
@@ -759,7 +839,7 @@ def RipUvFaces(context, operator):
                 luv.select = False
         if target:
             target.select = True
-        return SuccessFinished(me, startTime)
+        return SuccessFinished(me, profile)
 
     DeselectAll()
 
@@ -768,10 +848,11 @@ def RipUvFaces(context, operator):
             luv = l[uv_layer]
             luv.select = True
 
-    return SuccessFinished(me, startTime)
+    return SuccessFinished(me, profile)
 
 def JoinUvFaces(context, operator):
-    startTime = timer()
+    profile = _profile.StageProfile("Join Faces")
+    _settings.uv_profile = profile
 
     obj = context.active_object
     me = obj.data
@@ -813,7 +894,7 @@ def JoinUvFaces(context, operator):
                     v.x = minV.uv.x
                     v.y = minV.uv.y
 
-    return SuccessFinished(me, startTime)
+    return SuccessFinished(me, profile)
 
 def DeselectAll():
     bpy.ops.uv.select_all(action='DESELECT')
@@ -839,12 +920,17 @@ class BETOOLS_OT_UvSquaresByShape(bpy.types.Operator):
     bl_label = "UVs to grid with respect to shape"
     bl_options = {'REGISTER', 'UNDO'}
 
+    use_edge_length : bpy.props.BoolProperty(
+        name="Space by Edge Length",
+        description="Space the verts of a straightened line by their 3D edge lengths instead of evenly",
+        default=False)
+
     @classmethod
     def poll(cls, context):
         return (context.mode == 'EDIT_MESH')
 
     def execute(self, context):
-        main(context, self)
+        main(context, self, edgeLength=self.use_edge_length)
         return {'FINISHED'}
 
 class BETOOLS_OT_RipFaces(bpy.types.Operator):
@@ -861,7 +947,26 @@ class BETOOLS_OT_RipFaces(bpy.types.Operator):
         RipUvFaces(context, self)
         return {'FINISHED'}
 
+class BETOOLS_OT_ExportUVProfile(bpy.types.Operator, ExportHelper):
+    """Write the stage timings of the last Rectify/Squarify run to json"""
+    bl_idname = "uv.be_export_uv_profile"
+    bl_label = "Export UV Profile"
+    bl_options = {'REGISTER'}
+
+    filename_ext = ".json"
+    filter_glob : bpy.props.StringProperty(default="*.json", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return _settings.uv_profile is not None
+
+    def execute(self, context):
+        _settings.uv_profile.dump(self.filepath)
+        self.report({'INFO'}, "Saved UV profile to {}".format(self.filepath))
+        return {'FINISHED'}
+
 
 bpy.utils.register_class(BETOOLS_OT_UvSquaresByShape)
 bpy.utils.register_class(BETOOLS_OT_UvSquares)
 bpy.utils.register_class(BETOOLS_OT_RipFaces)
+bpy.utils.register_class(BETOOLS_OT_ExportUVProfile)
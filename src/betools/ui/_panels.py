@@ -642,6 +642,44 @@ class UI_PT_UVTexel(Panel):
         row.operator("uv.be_get_texel", text="Get")
         row.operator("uv.be_set_texel", text="Set")
 
+        material = context.object.active_material if context.object else None
+        if material:
+            row = col.row(align=True)
+            row.label(text="{}: ".format(material.name))
+            row.prop(material, "betools_texel_density", text="")
+        row = col.row(align=True)
+        row.operator("uv.be_set_material_texel", text="Set by Material", icon='MATERIAL')
+
+        col = box.column(align=True)
+        row = col.row(align=True)
+        row.label(text="Tolerance: ")
+        row.prop(uv_props, "texel_tolerance", text="")
+        row = col.row(align=True)
+        row.operator("uv.be_texel_histogram", text="Measure Islands")
+        row.operator("uv.be_select_texel_outliers", text="Select Outliers")
+
+        row = col.row(align=True)
+        row.prop(uv_props, "texel_heatmap_min", text="Min")
+        row.prop(uv_props, "texel_heatmap_max", text="Max")
+        row = col.row(align=True)
+        row.operator("uv.be_texel_heatmap", text="Density Heatmap", icon='COLOR')
+        row = col.row(align=True)
+        row.operator("scene.be_texel_audit", text="Audit Scene", icon='FILE_TEXT')
+
+        histogram = _settings.texel_histogram
+        if histogram:
+            col = box.column(align=True)
+            col.label(text="{} islands, {} outside {:.0f} - {:.0f}".format(
+                histogram["islands"], histogram["outliers"], histogram["low"], histogram["high"]))
+            counts = histogram["counts"]
+            edges = histogram["edges"]
+            peak = max(counts) if counts else 0
+            for i, count in enumerate(counts):
+                outside = edges[i + 1] < histogram["low"] or edges[i] > histogram["high"]
+                row = col.row(align=True)
+                row.label(text="{:.0f} - {:.0f}".format(edges[i], edges[i + 1]), icon='ERROR' if outside else 'CHECKMARK')
+                row.label(text="{} {}".format("|" * int(round(20 * count / peak)) if peak else "", count))
+
         col = box.column(align=True)
         row = col.row()
         row.label(text="Texel Cubes: ", icon="MESH_CUBE")
@@ -670,16 +708,24 @@ class UI_PT_UVTrim(Panel):
         col.scale_y = 1.75
         row = col.row(align=True)
         row.operator('uv.be_trim_template', text="Assign Trim Template", icon='NODE_TEXTURE')
+        row = col.row(align=True)
+        row.operator('uv.be_trim_from_image', text="Trims from Image", icon='IMAGE_DATA')
         
         col = box.column(align=True)
         row = col.row(align=True)
-        row.label(text="Template Mesh: ")
+        row.label(text="Template Image: " if settings.trim_image else "Template Mesh: ")
         
         row = col.row(align=True)
-        row.prop(settings, "trim_mesh", emboss=False, text="")
+        row.prop(settings, "trim_image" if settings.trim_image else "trim_mesh", emboss=False, text="")
         row.enabled = False
         
         col.scale_y = 1
+        material = context.object.active_material if context.object else None
+        if material:
+            row = col.row(align=True)
+            row.label(text="{}: ".format(material.name))
+            row.prop(material, "betools_trim_template", text="")
+
         row = col.row(align=True)
         row.label(text="Fit Mode: ")
         row = col.row(align=True)
@@ -688,6 +734,10 @@ class UI_PT_UVTrim(Panel):
         row = col.row(align=True)
         row.operator('uv.be_trim_fit', text="Snap Shell to Trim", icon='ALIGN_MIDDLE')
 
+        row = col.row(align=True)
+        row.prop(settings, "trim_layout_dropdown", text="")
+        row.operator('uv.be_trim_fit_batch', text="Snap All Shells")
+
         col = box.column(align=True)
         row = col.row(align=True)
         row.label(text="Shift Trim Shell", icon_value=_icon.get_icon("be_move"))
@@ -695,6 +745,10 @@ class UI_PT_UVTrim(Panel):
         row = col.row(align=True)
         row.operator('uv.be_trim_shift', text="Shift Up", icon='TRIA_UP').direction = "UP"
 
+        row = col.row(align=True)
+        row.operator('uv.be_trim_shift', text="Left", icon='TRIA_LEFT').direction = "LEFT"
+        row.operator('uv.be_trim_shift', text="Right", icon='TRIA_RIGHT').direction = "RIGHT"
+
         row = col.row(align=True)
         row.operator('uv.be_trim_shift', text="Shift Down", icon='TRIA_DOWN').direction = "DOWN"
 
@@ -710,6 +764,17 @@ class UI_PT_UVTrim(Panel):
         # TODOadd random horizontal offset?
 
 
+class BETOOLS_UL_ColorIDs(bpy.types.UIList):
+    """ Palette of the color ID map, double click a name to rename it
+    """
+
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, "name", text="", emboss=False)
+        row.prop(item, "color", text="")
+        row.operator("uv.be_assign_color", text="", icon_value=_icon.get_icon("be_assign")).index = index
+
+
 class UI_PT_UVColorID(Panel):
     """ Create and modify ID maps
     """
@@ -736,17 +801,14 @@ class UI_PT_UVColorID(Panel):
         row.operator("uv.be_remove_color", text="", icon="REMOVE")
 
         col = box.column(align=True)
+        col.template_list("BETOOLS_UL_ColorIDs", "", settings, "color_ids", settings, "color_id_index", rows=4)
 
-        for i in range(settings.color_id_count):
-            row = col.row(align=True)
-            row.label(text=getattr(settings, "color_id_{}_name".format(i)))
-            row.prop(settings, "color_id_{}".format(i), text="")
-            row.operator("uv.be_enable_rename_color", text="", icon_value=_icon.get_icon("be_edit")).index=i
-            row.operator("uv.be_assign_color", text="", icon_value=_icon.get_icon("be_assign")).index=i
-            if getattr(settings, "color_id_{}_rename".format(i)):
-                row = col.row(align=True)
-                row.prop(settings, "rename_material", text="")
-                row.operator("uv.be_rename_color", text="", icon_value=_icon.get_icon("be_rename")).index=i
+        col = layout.column(align=True)
+        row = col.row(align=True)
+        row.prop(settings, "color_id_auto_dropdown", text="")
+        if settings.color_id_auto_dropdown == 'NORMAL':
+            row.prop(settings, "color_id_clusters", text="")
+        col.operator("uv.be_auto_color_id", text="Auto Color ID")
 
         col = layout.column(align=True)
         row=col.row(align=True)
@@ -760,6 +822,10 @@ class UI_PT_UVColorID(Panel):
         bake.size = int(settings.map_size_dropdown)
 
         col = layout.column()
+        col.operator("uv.be_bleed_image", text="Bleed Image").bleed = max(1, settings.color_id_pixel_bleed)
+
+        col = layout.column()
+        col.operator("uv.be_compact_id_mats", text="Compact ID Materials")
         col.operator("uv.be_clear_id_mats", text="Clear ID Materials")
 
 
@@ -801,5 +867,19 @@ class UI_PT_UVUtils(Panel):
         row = col.row(align=True)
         row.operator("uv.export_layout", text="Export UV Layout", icon_value=_icon.get_icon("be_export"))
 
+        profile = _settings.uv_profile
+        if profile:
+            col = box.column(align=True)
+            row = col.row()
+            row.label(text="{}: {:.3f}s".format(profile.name, profile.total), icon="TIME")
+            for name, stage in profile.stages.items():
+                row = col.row()
+                row.label(text=name)
+                row.label(text="{:.1f} ms ({})".format(stage["time"] * 1000.0, stage["calls"]))
+                if stage["items"]:
+                    row.label(text="{:,}".format(stage["items"]))
+            row = col.row(align=True)
+            row.operator("uv.be_export_uv_profile", text="Export Profile", icon_value=_icon.get_icon("be_export"))
+
 
 bpy.types.Scene.snap_object = bpy.props.StringProperty()
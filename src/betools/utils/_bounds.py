@@ -0,0 +1,294 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Bounding volumes of mesh objects from flat vertex arrays"""
+
+import numpy as np
+
+
+def get_vertex_positions(obj, matrix=None, mesh=None):
+    """Vertex coordinates of a mesh object as an (N, 3) float64 array. Edit
+        mode meshes are synced first so no mode switch is needed.
+
+    Args:
+        obj (bpy.types.Object): mesh object
+        matrix (mathutils.Matrix): 4x4 transform applied to the local
+            coordinates, the world matrix when None
+        mesh (bpy.types.Mesh): mesh to read instead of the object data,
+            read as is without syncing
+
+    """
+
+    if mesh is None:
+        mesh = obj.data
+        if obj.mode == 'EDIT':
+            obj.update_from_editmode()
+
+    # read in the native float32 so foreach_get can copy the buffer directly
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    co = co.reshape(-1, 3).astype(np.float64)
+
+    matrix = np.array(obj.matrix_world if matrix is None else matrix, dtype=np.float64)
+    return co @ matrix[:3, :3].T + matrix[:3, 3]
+
+def get_bounds(points):
+    """Axis aligned bounds of (N, 3) points
+
+    Returns:
+        (min, max, center) arrays, zeros when there are no points
+
+    """
+
+    if not len(points):
+        zero = np.zeros(3)
+        return zero, zero.copy(), zero.copy()
+    bb_min = points.min(axis=0)
+    bb_max = points.max(axis=0)
+    return bb_min, bb_max, (bb_min + bb_max) * 0.5
+
+def get_world_bounds(obj):
+    """World space axis aligned bounds of a mesh object, see get_bounds"""
+    return get_bounds(get_vertex_positions(obj))
+
+
+#######################################
+#  Oriented Boxes
+#######################################
+
+# rotated hull points tested per pass of the rotating calipers
+_CALIPER_BATCH = 1 << 22
+
+# points projected per pass when searching extreme points
+_EXTREME_BATCH = 1 << 16
+
+
+def _get_sphere_directions(count):
+    """Evenly spread unit directions on a Fibonacci sphere"""
+    index = np.arange(count) + 0.5
+    z = 1.0 - 2.0 * index / count
+    radius = np.sqrt(1.0 - z * z)
+    angle = np.pi * (3.0 - np.sqrt(5.0)) * index
+    return np.column_stack((radius * np.cos(angle), radius * np.sin(angle), z))
+
+# directions whose extreme points stand in for the 3d convex hull
+_HULL_DIRECTIONS = _get_sphere_directions(128)
+
+# unit directions of the extreme points used to discard interior points
+_OCTAGON = np.array([(np.cos(a), np.sin(a)) for a in np.arange(8) * np.pi / 4.0])
+
+
+def get_extreme_points(points, directions=_HULL_DIRECTIONS):
+    """Indices of the points farthest along each direction. They all lie on
+        the convex hull, with enough directions they stand in for it.
+    """
+
+    best_index = np.zeros(len(directions), dtype=np.int64)
+    best_value = np.full(len(directions), -np.inf)
+    directions = directions.astype(np.float32)
+    for start in range(0, len(points), _EXTREME_BATCH):
+        batch = np.asarray(points[start:start + _EXTREME_BATCH], dtype=np.float32)
+        # one row per direction keeps the argmax on contiguous memory
+        projected = directions @ batch.T
+        index = np.argmax(projected, axis=1)
+        value = projected[np.arange(len(directions)), index]
+        better = value > best_value
+        best_index[better] = index[better] + start
+        best_value[better] = value[better]
+    return np.unique(best_index)
+
+def get_hull_2d(points):
+    """Indices of the convex hull of (N, 2) points in counter clockwise order.
+        Points inside the polygon of the extreme points in eight directions
+        are discarded in bulk first, the monotone chain only walks the rest.
+    """
+
+    if len(points) < 3:
+        return np.arange(len(points))
+
+    x = np.ascontiguousarray(points[:, 0])
+    y = np.ascontiguousarray(points[:, 1])
+    extremes = list(dict.fromkeys(int(np.argmax(x * cos + y * sin)) for cos, sin in _OCTAGON))
+    candidates = np.arange(len(points))
+    if len(extremes) >= 3:
+        # the extremes are already in counter clockwise order
+        outside = np.zeros(len(points), dtype=bool)
+        for start, end in zip(extremes, extremes[1:] + extremes[:1]):
+            (sx, sy), (ex, ey) = points[start], points[end]
+            outside |= (ex - sx) * (y - sy) - (ey - sy) * (x - sx) <= 0.0
+        candidates = np.flatnonzero(outside)
+
+    order = candidates[np.lexsort((points[candidates, 1], points[candidates, 0]))]
+    sorted_points = points[order].tolist()
+
+    def half_hull(indices):
+        chain = []
+        for i in indices:
+            px, py = sorted_points[i]
+            while len(chain) >= 2:
+                ox, oy = sorted_points[chain[-2]]
+                ax, ay = sorted_points[chain[-1]]
+                if (ax - ox) * (py - oy) - (ay - oy) * (px - ox) > 0.0:
+                    break
+                chain.pop()
+            chain.append(i)
+        return chain
+
+    lower = half_hull(range(len(order)))
+    upper = half_hull(range(len(order) - 1, -1, -1))
+    return order[lower[:-1] + upper[:-1]]
+
+def get_min_area_rect(points):
+    """Smallest rectangle around (N, 2) points by rotating calipers, one of
+        its sides lies on an edge of the convex hull
+
+    Returns:
+        (angle, min, max) with min and max in the frame rotated by angle
+
+    """
+
+    hull = points[get_hull_2d(points)]
+    if len(hull) < 3:
+        return 0.0, points.min(axis=0), points.max(axis=0)
+
+    edges = np.roll(hull, -1, axis=0) - hull
+    angles = np.unique(np.mod(np.arctan2(edges[:, 1], edges[:, 0]), np.pi / 2.0))
+
+    best = None
+    step = max(1, _CALIPER_BATCH // len(hull))
+    for start in range(0, len(angles), step):
+        batch = angles[start:start + step]
+        cos = np.cos(batch)[:, None]
+        sin = np.sin(batch)[:, None]
+        x = hull[:, 0] * cos + hull[:, 1] * sin
+        y = hull[:, 1] * cos - hull[:, 0] * sin
+        low = np.stack((x.min(axis=1), y.min(axis=1)), axis=1)
+        high = np.stack((x.max(axis=1), y.max(axis=1)), axis=1)
+        area = np.prod(high - low, axis=1)
+        i = int(np.argmin(area))
+        if best is None or area[i] < best[0]:
+            best = (area[i], batch[i], low[i], high[i])
+
+    return best[1], best[2], best[3]
+
+def fit_oriented_box(points):
+    """Tight oriented box around (N, 3) points. Each axis of the principal
+        component and the input frames is tried as the box height, the
+        rotation around it comes from the rotating calipers, and the box
+        with the smallest volume is kept. The calipers only see the
+        extreme points along a hundred or so directions, found in one
+        pass, so the 2d hulls stay small on dense meshes.
+
+    Returns:
+        (center, axes, half extents), axes is a right handed (3, 3) array
+        with one unit axis per row
+
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 2:
+        bb_min, bb_max, center = get_bounds(points)
+        return center, np.identity(3), (bb_max - bb_min) * 0.5
+
+    centered = points - points.mean(axis=0)
+    principal = np.linalg.eigh(centered.T @ centered)[1].T
+    hull = points[get_extreme_points(points)]
+
+    best = None
+    for frame in (principal, np.identity(3)):
+        for up in range(3):
+            normal = frame[up]
+            side_u = frame[(up + 1) % 3]
+            side_v = np.cross(normal, side_u)
+
+            angle, low, high = get_min_area_rect(hull @ np.stack((side_u, side_v)).T)
+            axis_u = np.cos(angle) * side_u + np.sin(angle) * side_v
+            axis_v = np.cross(normal, axis_u)
+            axes = np.stack((axis_u, axis_v, normal))
+
+            projected = points @ axes.T
+            bb_min = projected.min(axis=0)
+            bb_max = projected.max(axis=0)
+            volume = np.prod(bb_max - bb_min)
+            if best is None or volume < best[0] - 1e-12:
+                best = (volume, axes, bb_min, bb_max)
+
+    _, axes, bb_min, bb_max = best
+    center = ((bb_min + bb_max) * 0.5) @ axes
+    return center, axes, (bb_max - bb_min) * 0.5
+
+
+#######################################
+#  Spheres
+#######################################
+
+def _get_circumsphere(support):
+    """Smallest sphere through up to four points, degenerate sets are solved
+        in the least squares sense
+
+    Returns:
+        (center, radius), radius is -1 without points
+
+    """
+
+    if not support:
+        return np.zeros(3), -1.0
+    origin = support[0]
+    if len(support) == 1:
+        return origin, 0.0
+
+    edges = np.array(support[1:]) - origin
+    lhs = 2.0 * edges @ edges.T
+    rhs = (edges * edges).sum(axis=1)
+    weights = np.linalg.lstsq(lhs, rhs, rcond=None)[0]
+    center = origin + weights @ edges
+    return center, float(np.linalg.norm(center - origin))
+
+def _get_welzl_sphere(points, count, support):
+    """Welzl's recursion over the first count points with the support points
+        on the sphere boundary
+    """
+
+    if count == 0 or len(support) == 4:
+        return _get_circumsphere(support)
+
+    center, radius = _get_welzl_sphere(points, count - 1, support)
+    point = points[count - 1]
+    if radius >= 0.0 and np.linalg.norm(point - center) <= radius * (1.0 + 1e-9) + 1e-12:
+        return center, radius
+    return _get_welzl_sphere(points, count - 1, support + [point])
+
+def get_min_sphere(points, max_iterations=64):
+    """Minimum enclosing sphere of (N, 3) points. Welzl's algorithm runs on
+        a small core set seeded with Ritter's extreme points, and the point
+        farthest outside the current sphere is added until the sphere holds
+        every point, so only the distance test touches all points.
+
+    Returns:
+        (center, radius)
+
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    if not len(points):
+        return np.zeros(3), 0.0
+
+    # Ritter's seed, the farthest pair found from an arbitrary point plus
+    # the extremes along each axis
+    far = points[np.argmax(((points - points[0]) ** 2).sum(axis=1))]
+    seeds = [np.argmax(((points - far) ** 2).sum(axis=1))]
+    seeds += list(np.argmin(points, axis=0)) + list(np.argmax(points, axis=0))
+    core = [far] + [points[i] for i in dict.fromkeys(int(i) for i in seeds)]
+
+    for _ in range(max_iterations):
+        center, radius = _get_welzl_sphere(core, len(core), [])
+        distance = np.sqrt(((points - center) ** 2).sum(axis=1))
+        farthest = int(np.argmax(distance))
+        if distance[farthest] <= radius * (1.0 + 1e-7) + 1e-12:
+            break
+        # the new point is the most likely to be on the boundary
+        core.insert(0, points[farthest])
+
+    return center, max(radius, float(distance.max()))
@@ -0,0 +1,137 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Ordered UV edge chains for straightening long edge loops"""
+
+import numpy as np
+
+
+def get_selected_uv_chain(bm, uv_layer, precision=5):
+    """Collect the selected UV edges as a graph of UV positions.
+
+        Loops of the same vert at the same (rounded) UV position are one
+        node. Neighbouring verts never weld however dense the loop is, and
+        the copies of a vert on either side of a seam stay apart.
+
+    Args:
+        bm (bmesh)
+        uv_layer
+        precision (int): rounding used to weld the loop uvs of a vert
+
+    Returns:
+        dict: "loops" (list of loop uv lists per node), "points" (N, 2),
+            "edges" (E, 2) node indices, "lengths" (E,) 3D edge lengths
+
+    """
+
+    node_index = {}
+    loops = []
+    points = []
+    edges = {}
+
+    def get_node(loop, luv):
+        key = (loop.vert.index, round(luv.uv.x, precision), round(luv.uv.y, precision))
+        index = node_index.get(key)
+        if index is None:
+            index = len(loops)
+            node_index[key] = index
+            loops.append([])
+            points.append((luv.uv.x, luv.uv.y))
+        return index
+
+    for face in bm.faces:
+        if not face.select:
+            continue
+        for loop in face.loops:
+            luv = loop[uv_layer]
+            if not luv.select:
+                continue
+            a = get_node(loop, luv)
+            loops[a].append(luv)
+
+            next_loop = loop.link_loop_next
+            next_luv = next_loop[uv_layer]
+            if not next_luv.select:
+                continue
+            b = get_node(next_loop, next_luv)
+            if a != b:
+                edges.setdefault((min(a, b), max(a, b)), loop.edge.calc_length())
+
+    return {
+        "loops": loops,
+        "points": np.array(points, dtype=np.float64).reshape(-1, 2),
+        "edges": np.array(list(edges.keys()), dtype=np.int64).reshape(-1, 2),
+        "lengths": np.array(list(edges.values()), dtype=np.float64)
+    }
+
+def order_chain(edges, count):
+    """Walk an edge list from one end to the other.
+
+    Args:
+        edges (array): (E, 2) node indices
+        count (int): number of nodes
+
+    Returns:
+        (order, edge_order) index arrays, or None when the edges are not a
+        single open path (branches, loops or disconnected pieces)
+
+    """
+
+    if count < 2 or len(edges) != count - 1:
+        return None
+
+    degree = np.bincount(edges.ravel(), minlength=count)
+    if degree.max() > 2 or degree.min() == 0:
+        return None
+
+    neighbours = [[] for _ in range(count)]
+    for edge_index, (a, b) in enumerate(edges.tolist()):
+        neighbours[a].append((b, edge_index))
+        neighbours[b].append((a, edge_index))
+
+    node = int(np.flatnonzero(degree == 1)[0])
+    previous = -1
+    order = [node]
+    edge_order = []
+    while len(order) < count:
+        for next_node, edge_index in neighbours[node]:
+            if next_node != previous:
+                break
+        else:
+            return None
+        previous, node = node, next_node
+        order.append(node)
+        edge_order.append(edge_index)
+
+    return np.array(order), np.array(edge_order)
+
+def chain_parameters(segment_lengths):
+    """Cumulative arc length along a chain normalised to 0-1"""
+    arc = np.concatenate(([0.0], np.cumsum(segment_lengths)))
+    if arc[-1] <= 0.0:
+        return np.linspace(0.0, 1.0, len(arc))
+    return arc / arc[-1]
+
+def straighten_chain(start, end, count, segment_lengths=None):
+    """Positions for an ordered chain laid on the line from start to end.
+
+    Args:
+        start (array): first position
+        end (array): last position
+        count (int): number of nodes
+        segment_lengths (array): (count - 1,) weights, None spaces evenly
+
+    Returns:
+        array (count, 2)
+
+    """
+
+    if segment_lengths is None:
+        t = np.linspace(0.0, 1.0, count)
+    else:
+        t = chain_parameters(segment_lengths)
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    return start + t[:, None] * (end - start)
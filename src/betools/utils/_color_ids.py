@@ -0,0 +1,228 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Color IDs stored in an integer face attribute, independent of materials"""
+
+import bpy
+import bmesh
+import numpy as np
+from . import _texel
+from .. import _settings
+
+
+# face attribute holding the palette index of each face, -1 without an ID
+ID_ATTRIBUTE = "BT_ColorID"
+
+
+def get_palette(settings):
+    """(count, 4) colors of the color ID palette, read once and cached until
+        a color is added, removed or edited
+    """
+
+    key = settings.as_pointer()
+    palette = _settings.color_id_palettes.get(key)
+    if palette is None or len(palette) != len(settings.color_ids):
+        colors = np.empty(len(settings.color_ids) * 3, dtype=np.float32)
+        settings.color_ids.foreach_get("color", colors)
+        palette = np.ones((len(settings.color_ids), 4), dtype=np.float32)
+        palette[:, :3] = colors.reshape(-1, 3)
+        _settings.color_id_palettes[key] = palette
+    return palette
+
+def has_face_ids(obj):
+    return obj.type == 'MESH' and ID_ATTRIBUTE in obj.data.attributes
+
+def get_face_ids(obj, mesh=None):
+    """Palette index of every face, -1 for faces without an ID
+
+    Args:
+        obj (bpy.types.Object): mesh object, synced first in edit mode
+        mesh (bpy.types.Mesh): mesh to read instead of the object data
+
+    """
+
+    if mesh is None:
+        mesh = obj.data
+        if obj.mode == 'EDIT':
+            obj.update_from_editmode()
+
+    ids = np.full(len(mesh.polygons), -1, dtype=np.int32)
+    attribute = mesh.attributes.get(ID_ATTRIBUTE)
+    if attribute is not None and attribute.domain == 'FACE':
+        attribute.data.foreach_get("value", ids)
+    return ids
+
+def set_face_ids(obj, face_mask, index):
+    """Write an ID to the masked faces, creating the attribute with every
+        face unassigned if needed. Edit mode meshes are written through
+        bmesh so the change isn't lost when leaving edit mode.
+
+    Args:
+        obj (bpy.types.Object): mesh object
+        face_mask (np.ndarray): (face count,) faces to write
+        index (int or np.ndarray): one ID, or an ID per face
+
+    """
+
+    mesh = obj.data
+    if obj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(mesh)
+        layer = bm.faces.layers.int.get(ID_ATTRIBUTE)
+        if layer is None:
+            layer = bm.faces.layers.int.new(ID_ATTRIBUTE)
+            for face in bm.faces:
+                face[layer] = -1
+        bm.faces.ensure_lookup_table()
+        face_indices = np.flatnonzero(face_mask)
+        values = np.broadcast_to(index, face_mask.shape)[face_indices]
+        for face_index, value in zip(face_indices.tolist(), values.tolist()):
+            bm.faces[face_index][layer] = value
+        bmesh.update_edit_mesh(mesh)
+        return
+
+    ids = get_face_ids(obj)
+    if ID_ATTRIBUTE not in mesh.attributes:
+        mesh.attributes.new(ID_ATTRIBUTE, 'INT', 'FACE')
+    ids[face_mask] = np.broadcast_to(index, face_mask.shape)[face_mask]
+    mesh.attributes[ID_ATTRIBUTE].data.foreach_set("value", ids)
+    mesh.update()
+
+def remove_face_id(index):
+    """Unassign the faces of a removed palette entry on every mesh and move
+        the later IDs down one entry
+    """
+
+    meshes = set()
+    for obj in bpy.data.objects:
+        if not has_face_ids(obj) or obj.data in meshes:
+            continue
+        meshes.add(obj.data)
+        ids = get_face_ids(obj)
+        changed = ids >= index
+        if changed.any():
+            ids[ids == index] = -1
+            ids[ids > index] -= 1
+            set_face_ids(obj, changed, ids)
+
+def get_id_colors(ids, palette):
+    """Palette colors of face ids
+
+    Returns:
+        ((N, 4) colors, (N,) mask of the ids in the palette), unassigned
+        ids get no color and are left out of the mask
+
+    """
+
+    colors = np.zeros((len(ids), 4), dtype=np.float32)
+    valid = (ids >= 0) & (ids < len(palette))
+    colors[valid] = palette[ids[valid]]
+    return colors, valid
+
+
+#######################################
+#  Automatic IDs
+#######################################
+
+def get_loose_part_labels(data):
+    """Label every face with its loose part, faces sharing a vertex are
+        connected
+
+    Returns:
+        (face count,) array of part labels
+
+    """
+
+    loop_verts = data["loop_verts"]
+    if not len(loop_verts):
+        return np.zeros(0, dtype=np.int64)
+
+    # link every loop's vertex to the first vertex of its face
+    first_verts = loop_verts[data["loop_start"]][data["loop_faces"]]
+    vert_labels = _texel.get_connected_components(len(data["co"]), first_verts, loop_verts)
+
+    # renumber without the loose vertices so face labels are contiguous
+    face_labels = vert_labels[loop_verts[data["loop_start"]]]
+    return np.unique(face_labels, return_inverse=True)[1].reshape(-1)
+
+def get_face_normals(data):
+    """World space normals and areas of every face, from the area weighted
+        sum of its loop triangle normals
+
+    Returns:
+        ((face count, 3) unit normals, (face count,) areas)
+
+    """
+
+    face_count = len(data["loop_start"])
+    points = data["co"][data["loop_verts"][data["tri_loops"]]]
+    cross = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+
+    normals = np.empty((face_count, 3))
+    for axis in range(3):
+        normals[:, axis] = np.bincount(data["tri_faces"], weights=cross[:, axis], minlength=face_count)
+    length = np.linalg.norm(normals, axis=1)
+    normals /= np.maximum(length, 1e-12)[:, None]
+    return normals, length * 0.5
+
+def cluster_normals(normals, count, weights=None, iterations=20):
+    """Group unit normals into directions by spherical k-means. Centers are
+        seeded with the normals farthest from the ones already chosen, so the
+        result is the same on every run.
+
+    Args:
+        normals (np.ndarray): (N, 3) unit normals
+        count (int): number of clusters
+        weights (np.ndarray): (N,) weight per normal, e.g. face area
+        iterations (int): most assignment and update passes
+
+    Returns:
+        (N,) cluster labels from 0 to the number of non empty clusters
+
+    """
+
+    if not len(normals):
+        return np.zeros(0, dtype=np.int64)
+    if weights is None:
+        weights = np.ones(len(normals))
+
+    count = max(1, min(count, len(normals)))
+    chosen = [int(np.argmax(weights))]
+    closest = normals @ normals[chosen[0]]
+    for _ in range(count - 1):
+        chosen.append(int(np.argmin(closest)))
+        closest = np.maximum(closest, normals @ normals[chosen[-1]])
+    centers = normals[chosen].copy()
+
+    labels = None
+    for _ in range(iterations):
+        new_labels = np.argmax(normals @ centers.T, axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        sums = np.empty_like(centers)
+        for axis in range(3):
+            sums[:, axis] = np.bincount(labels, weights=normals[:, axis] * weights, minlength=count)
+        length = np.linalg.norm(sums, axis=1)
+        # empty clusters keep their center
+        filled = length > 1e-12
+        centers[filled] = sums[filled] / length[filled, None]
+
+    return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+def get_auto_labels(data, mode, clusters=6):
+    """Face labels for automatic IDs, see COLOR_ID_AUTO_MODES
+
+    Returns:
+        (face count,) labels from 0 to the number of groups
+
+    """
+
+    if mode == 'ISLAND':
+        return _texel.get_uv_island_labels(data)
+    if mode == 'ELEMENT':
+        return get_loose_part_labels(data)
+    normals, areas = get_face_normals(data)
+    return cluster_normals(normals, clusters, areas)
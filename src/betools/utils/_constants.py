@@ -74,3 +74,15 @@ TRIM_FIT_MODES = [
 	('HORIZONTAL_FIT', 'Horizontal Fit', 'Scale the entire UV shell for best horizontal fit'),
 	('BESTFIT', 'Best Fit', 'Scale the shell to the closest sized trim slot and fill the entire space')
 ]
+
+TRIM_LAYOUT_MODES = [
+	('OVERLAP', 'Overlap', 'Fit every UV shell to the whole trim slot'),
+	('STACK', 'Stack', 'Split the trim slot height between the UV shells sharing it'),
+	('TILE', 'Tile', 'Split the trim slot width between the UV shells sharing it')
+]
+
+COLOR_ID_AUTO_MODES = [
+	('ISLAND', 'UV Island', 'One color per UV island'),
+	('ELEMENT', 'Loose Part', 'One color per connected mesh part'),
+	('NORMAL', 'Normal Direction', 'One color per group of faces facing a similar direction')
+]
@@ -0,0 +1,63 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Per stage timing for operators that walk large meshes"""
+
+import json
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+
+class StageProfile():
+    """Accumulate named stage timings for a single operator run.
+
+        Stages keep the order they were first entered in, a stage that runs
+        more than once (one per object or island) adds to its total and call
+        count instead of creating a new entry.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.start_time = timer()
+        self.total = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with block as the given stage"""
+        start = timer()
+        try:
+            yield
+        finally:
+            self.add(name, timer() - start)
+
+    def add(self, name, elapsed):
+        stage = self.stages.setdefault(name, {"time": 0.0, "calls": 0, "items": 0})
+        stage["time"] += elapsed
+        stage["calls"] += 1
+
+    def count(self, name, items):
+        """Add to the number of elements (faces, triangles) a stage handled"""
+        stage = self.stages.setdefault(name, {"time": 0.0, "calls": 0, "items": 0})
+        stage["items"] += items
+
+    def finish(self):
+        self.total = timer() - self.start_time
+        return self.total
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "total": self.total,
+            "stages": [
+                {"name": name, "time": stage["time"], "calls": stage["calls"], "items": stage["items"]}
+                for name, stage in self.stages.items()
+            ]
+        }
+
+    def dump(self, filepath):
+        """Write the profile to a json file"""
+        with open(filepath, 'w') as profile_file:
+            json.dump(self.to_dict(), profile_file, indent=4)
@@ -0,0 +1,278 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""CPU rasterization of flat colored uv triangles into image buffers"""
+
+import bpy
+import numpy as np
+from . import _texel
+from . import _color_ids
+
+
+# pixel candidates tested per pass, bounds the memory of large triangles
+_PIXEL_BATCH = 1 << 22
+
+# map size the bleed setting is given for
+_BLEED_REFERENCE_SIZE = 1024
+
+# neighbours a bleed step grows into, edges before corners
+_NEIGHBORS = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def get_material_color(material):
+    """Flat color of a material, the Principled BSDF base color when it
+        uses nodes, the viewport color otherwise
+    """
+
+    if material is None:
+        return (0.0, 0.0, 0.0, 1.0)
+    if material.use_nodes and material.node_tree:
+        node = material.node_tree.nodes.get("Principled BSDF")
+        if node is not None:
+            return tuple(node.inputs[0].default_value)
+    return tuple(material.diffuse_color)
+
+def linear_to_srgb(colors):
+    """sRGB encoded copy of (N, 4) linear colors, alpha is kept. Material
+        and palette colors are linear, byte images store sRGB values.
+    """
+
+    colors = np.array(colors, dtype=np.float32).reshape(-1, 4)
+    rgb = np.clip(colors[:, :3], 0.0, 1.0)
+    colors[:, :3] = np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * np.power(rgb, 1.0 / 2.4) - 0.055)
+    return colors
+
+def get_slot_colors(obj):
+    """(slot count, 4) material colors of an object, at least one row"""
+    colors = [get_material_color(slot.material) for slot in obj.material_slots]
+    if not colors:
+        colors = [get_material_color(None)]
+    return np.array(colors, dtype=np.float32)
+
+def _get_row_spans(points, width, height):
+    """Pixel spans covered by each triangle on each of its rows. A pixel is
+        covered when its center is inside the triangle.
+
+    Returns:
+        (triangle, row, first column, pixel count) arrays
+
+    """
+
+    a, b, c = points[:, 0], points[:, 1], points[:, 2]
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+    y0 = np.clip(np.floor(points[..., 1].min(axis=1)).astype(np.int64), 0, height)
+    y1 = np.clip(np.ceil(points[..., 1].max(axis=1)).astype(np.int64), 0, height)
+    rows = np.where(area != 0.0, y1 - y0, 0)
+
+    tri = np.repeat(np.arange(len(points)), rows)
+    row = np.arange(len(tri)) - np.repeat(np.cumsum(rows) - rows, rows) + y0[tri]
+    center = row + 0.5
+    sign = np.sign(area[tri])
+
+    # each edge keeps the pixel centers on its inner side, a bound on x
+    low = np.full(len(tri), -np.inf)
+    high = np.full(len(tri), np.inf)
+    for start, end in ((b, c), (c, a), (a, b)):
+        start = start[tri]
+        end = end[tri]
+        slope = -(end[:, 1] - start[:, 1]) * sign
+        offset = ((end[:, 0] - start[:, 0]) * (center - start[:, 1]) + (end[:, 1] - start[:, 1]) * start[:, 0]) * sign
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bound = -offset / slope
+        low = np.where(slope > 0.0, np.maximum(low, bound), low)
+        high = np.where(slope < 0.0, np.minimum(high, bound), high)
+        high = np.where((slope == 0.0) & (offset < 0.0), -np.inf, high)
+
+    first = np.clip(np.ceil(low - 0.5), 0, width).astype(np.int64)
+    last = np.clip(np.floor(high - 0.5) + 1, 0, width).astype(np.int64)
+    count = np.maximum(last - first, 0)
+    return tri, row, first, count
+
+def rasterize_triangles(tri_uvs, tri_colors, width, height, pixels=None):
+    """Fill uv triangles with flat colors, later triangles draw over
+        earlier ones
+
+    Args:
+        tri_uvs (np.ndarray): (N, 3, 2) triangle uvs
+        tri_colors (np.ndarray): (N, 4) color per triangle
+        width (int): image width
+        height (int): image height
+        pixels (np.ndarray): (height, width, 4) buffer to draw into, a
+            transparent one when None
+
+    Returns:
+        (height, width, 4) float32 pixels, row 0 at v = 0 like image.pixels
+
+    """
+
+    if pixels is None:
+        pixels = np.zeros((height, width, 4), dtype=np.float32)
+    pixels = np.ascontiguousarray(pixels, dtype=np.float32)
+
+    points = np.asarray(tri_uvs, dtype=np.float64).reshape(-1, 3, 2) * (width, height)
+    tri, row, first, count = _get_row_spans(points, width, height)
+    keep = count > 0
+    tri, row, first, count = tri[keep], row[keep], first[keep], count[keep]
+
+    # triangle drawn on each pixel, spans expanded in batches of pixels
+    labels = np.full(width * height, -1, dtype=np.int32)
+    ends = np.cumsum(count)
+    span_start = 0
+    while span_start < len(count):
+        pixel_start = ends[span_start] - count[span_start]
+        span_end = max(int(np.searchsorted(ends, pixel_start + _PIXEL_BATCH, side='right')), span_start + 1)
+
+        spans = slice(span_start, span_end)
+        span_count = count[spans]
+        offset = np.arange(int(span_count.sum())) - np.repeat(np.cumsum(span_count) - span_count, span_count)
+        index = np.repeat(row[spans] * width + first[spans], span_count) + offset
+        labels[index] = np.repeat(tri[spans], span_count)
+        span_start = span_end
+
+    # move whole rgba colors as single 16 byte values
+    palette = np.ascontiguousarray(tri_colors, dtype=np.float32).view(np.complex128).ravel()
+    flat = pixels.reshape(-1).view(np.complex128)
+    np.copyto(flat, palette[labels], where=labels >= 0)
+    return pixels
+
+def rasterize_color_id(obj, width, height, pixels=None, palette=None):
+    """Draw an object's uv triangles in the flat color of their ID from the
+        color ID face attribute, or of their material for meshes without it.
+        Faces without an ID are not drawn.
+
+    Returns:
+        (height, width, 4) pixels, or None when the mesh has no uvs
+
+    """
+
+    triangles = get_color_id_triangles(obj, palette)
+    if triangles is None:
+        return None
+    return rasterize_triangles(triangles[0], triangles[1], width, height, pixels)
+
+def get_color_id_triangles(obj, palette=None, uv_layer_name=None):
+    """uvs and ID colors of an object's loop triangles, see rasterize_color_id.
+        Triangles of faces without an ID are dropped so they don't paint
+        over other islands. Colors are sRGB encoded for the byte image of
+        get_bake_image, so they match the swatches and the Cycles bake.
+
+    Returns:
+        ((N, 3, 2) uvs, (N, 4) colors) or None when the mesh has no uvs
+
+    """
+
+    data = _texel.get_mesh_arrays(obj, uv_layer_name)
+    if data is None:
+        return None
+
+    tri_faces = data["tri_faces"]
+    tri_loops = data["tri_loops"]
+    if palette is not None and _color_ids.has_face_ids(obj):
+        face_colors, face_mask = _color_ids.get_id_colors(_color_ids.get_face_ids(obj), palette)
+        keep = face_mask[tri_faces]
+        tri_faces = tri_faces[keep]
+        tri_loops = tri_loops[keep]
+    else:
+        colors = get_slot_colors(obj)
+        face_colors = colors[np.clip(data["face_materials"], 0, len(colors) - 1)]
+    return data["uvs"][tri_loops], linear_to_srgb(face_colors)[tri_faces]
+
+def get_bake_image(name, width, height):
+    """Reuse the image of that name when its size matches, else a new one.
+        Bake images are sRGB byte images, pixels are written as stored.
+    """
+    image = bpy.data.images.get(name)
+    if image is None or tuple(image.size) != (width, height):
+        image = bpy.data.images.new(name, width=width, height=height, alpha=True)
+    image.colorspace_settings.name = 'sRGB'
+    image.use_fake_user = True
+    return image
+
+def get_bleed_width(bleed, width, height):
+    """Bleed in pixels for a map, scaled from the 1024 map bleed setting"""
+    return max(1, int(round(bleed * max(width, height) / _BLEED_REFERENCE_SIZE)))
+
+def bleed_pixels(pixels, distance, mask=None):
+    """Extend the colors at island borders into the empty pixels around
+        them. Filled pixels grow outward one ring per step, so the work
+        follows the size of the bleed band instead of the image.
+
+    Args:
+        pixels (np.ndarray): (height, width, 4) image, changed in place
+        distance (int): bleed width in pixels
+        mask (np.ndarray): (height, width) covered pixels, alpha above
+            zero when None
+
+    Returns:
+        pixels
+
+    """
+
+    height, width = pixels.shape[:2]
+    flat = pixels.reshape(-1, 4)
+    filled = (mask if mask is not None else pixels[..., 3] > 0.0).ravel().copy()
+    if filled.all() or not filled.any():
+        return pixels
+
+    # start from the covered pixels touching an empty one
+    covered = filled.reshape(height, width)
+    border = np.zeros_like(covered)
+    border[:, :-1] |= ~covered[:, 1:]
+    border[:, 1:] |= ~covered[:, :-1]
+    border[:-1] |= ~covered[1:]
+    border[1:] |= ~covered[:-1]
+    front = np.flatnonzero(covered & border)
+
+    for _ in range(distance):
+        rows, columns = np.divmod(front, width)
+        targets = []
+        sources = []
+        for dy, dx in _NEIGHBORS:
+            y = rows + dy
+            x = columns + dx
+            inside = (y >= 0) & (y < height) & (x >= 0) & (x < width)
+            target = y[inside] * width + x[inside]
+            empty = ~filled[target]
+            targets.append(target[empty])
+            sources.append(front[inside][empty])
+
+        targets = np.concatenate(targets)
+        if not len(targets):
+            break
+        # first source wins, edge neighbours come before corners
+        targets, first = np.unique(targets, return_index=True)
+        flat[targets] = flat[np.concatenate(sources)[first]]
+        filled[targets] = True
+        front = targets
+
+    return pixels
+
+def read_image_pixels(image, max_size=None):
+    """(height, width, 4) float32 pixels of an image. Images larger than
+        max_size are read from a scaled down copy.
+    """
+
+    width, height = image.size
+    source = image
+    factor = max_size / max(width, height) if max_size else 1.0
+    if factor < 1.0:
+        source = image.copy()
+        width = max(1, int(width * factor))
+        height = max(1, int(height * factor))
+        source.scale(width, height)
+
+    try:
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        source.pixels.foreach_get(pixels)
+    finally:
+        if source is not image:
+            bpy.data.images.remove(source)
+    return pixels.reshape(height, width, 4)
+
+def write_image_pixels(image, pixels):
+    """Write a (height, width, 4) buffer to an image of the same size"""
+    image.pixels.foreach_set(np.ascontiguousarray(pixels, dtype=np.float32).ravel())
+    image.update()
@@ -0,0 +1,441 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Vectorized texel density measurement on mesh loop triangles"""
+
+import bpy
+import bmesh
+import numpy as np
+from . import _bounds
+
+
+# uvs closer than this are welded when finding islands
+_UV_PRECISION = 5
+
+# heatmap ramp, too low - on target - too high
+HEATMAP_COLORS = np.array((
+    (0.0, 0.1, 1.0, 1.0),
+    (0.0, 1.0, 0.1, 1.0),
+    (1.0, 0.0, 0.0, 1.0)
+))
+
+
+#######################################
+#  Mesh Arrays
+#######################################
+
+def get_mesh_arrays(obj, uv_layer_name=None, mesh=None):
+    """Read the loop triangles, world space coordinates and uvs of a mesh
+        object into flat arrays. Edit mode meshes are synced first so no
+        mode switch is needed. The sync is one conversion in C, reading the
+        edit bmesh directly would take a Python loop over every loop since
+        bmesh has no foreach_get.
+
+    Args:
+        obj (bpy.types.Object): mesh object
+        uv_layer_name (str): uv map to read, the active map when None
+        mesh (bpy.types.Mesh): mesh to read instead of the object data,
+            e.g. the evaluated mesh with modifiers applied
+
+    Returns:
+        dict of arrays or None when the mesh has no uvs
+
+    """
+
+    if mesh is None:
+        mesh = obj.data
+        if obj.mode == 'EDIT':
+            obj.update_from_editmode()
+
+    uv_layer = mesh.uv_layers.get(uv_layer_name) if uv_layer_name else mesh.uv_layers.active
+    if uv_layer is None:
+        return None
+
+    mesh.calc_loop_triangles()
+
+    loop_count = len(mesh.loops)
+    face_count = len(mesh.polygons)
+    tri_count = len(mesh.loop_triangles)
+
+    co = _bounds.get_vertex_positions(obj, mesh=mesh)
+
+    loop_verts = np.empty(loop_count, dtype=np.int64)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+
+    uvs = np.empty(loop_count * 2, dtype=np.float64)
+    uv_layer.data.foreach_get("uv", uvs)
+
+    uv_select = np.empty(loop_count, dtype=bool)
+    uv_layer.data.foreach_get("select", uv_select)
+
+    uv_pin = np.empty(loop_count, dtype=bool)
+    uv_layer.data.foreach_get("pin_uv", uv_pin)
+
+    loop_start = np.empty(face_count, dtype=np.int64)
+    mesh.polygons.foreach_get("loop_start", loop_start)
+    loop_total = np.empty(face_count, dtype=np.int64)
+    mesh.polygons.foreach_get("loop_total", loop_total)
+
+    face_select = np.empty(face_count, dtype=bool)
+    mesh.polygons.foreach_get("select", face_select)
+
+    face_materials = np.empty(face_count, dtype=np.int64)
+    mesh.polygons.foreach_get("material_index", face_materials)
+
+    tri_loops = np.empty(tri_count * 3, dtype=np.int64)
+    mesh.loop_triangles.foreach_get("loops", tri_loops)
+    tri_faces = np.empty(tri_count, dtype=np.int64)
+    mesh.loop_triangles.foreach_get("polygon_index", tri_faces)
+
+    return {
+        "co": co,
+        "loop_verts": loop_verts,
+        "uvs": uvs.reshape(-1, 2),
+        "uv_select": uv_select,
+        "uv_pin": uv_pin,
+        "loop_start": loop_start,
+        "loop_total": loop_total,
+        "loop_faces": np.repeat(np.arange(face_count), loop_total),
+        "face_select": face_select,
+        "face_materials": face_materials,
+        "tri_loops": tri_loops.reshape(-1, 3),
+        "tri_faces": tri_faces,
+        "uv_layer": uv_layer.name
+    }
+
+def set_mesh_uvs(obj, data, uvs, face_mask):
+    """Write loop uvs back for the masked faces. Edit mode meshes are written
+        through the bmesh uv layer so the change isn't lost when leaving edit
+        mode, only the masked faces are visited.
+    """
+
+    mesh = obj.data
+    if obj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(mesh)
+        bm.faces.ensure_lookup_table()
+        uv_layer = bm.loops.layers.uv.get(data["uv_layer"])
+        loop_start = data["loop_start"]
+        uv_list = uvs.tolist()
+        for index in np.flatnonzero(face_mask).tolist():
+            start = int(loop_start[index])
+            for offset, loop in enumerate(bm.faces[index].loops):
+                loop[uv_layer].uv = uv_list[start + offset]
+        bmesh.update_edit_mesh(mesh)
+    else:
+        mesh.uv_layers[data["uv_layer"]].data.foreach_set("uv", uvs.ravel())
+        mesh.update()
+
+def set_face_selection(obj, data, face_mask):
+    """Select the masked faces, in the uv editor when sync selection is off
+        (masked faces are also selected in the mesh so they are displayed)
+    """
+
+    sync = bpy.context.scene.tool_settings.use_uv_select_sync
+    mesh = obj.data
+    if obj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(mesh)
+        uv_layer = bm.loops.layers.uv.get(data["uv_layer"])
+        if sync:
+            for vert in bm.verts:
+                vert.select = False
+            for edge in bm.edges:
+                edge.select = False
+        for index, face in enumerate(bm.faces):
+            selected = bool(face_mask[index])
+            if sync:
+                face.select = False
+            else:
+                for loop in face.loops:
+                    loop[uv_layer].select = selected
+            if selected:
+                face.select_set(True)
+        bmesh.update_edit_mesh(mesh)
+    else:
+        mesh.polygons.foreach_set("select", face_mask)
+        uv_select = face_mask[data["loop_faces"]]
+        mesh.uv_layers[data["uv_layer"]].data.foreach_set("select", uv_select)
+        mesh.update()
+
+def set_loop_colors(obj, name, colors):
+    """Write (loop count, 4) colors to a face corner color layer, created if
+        missing and made active so the viewport shows it. Edit mode meshes
+        are synced once, written with foreach_set and loaded back into the
+        edit bmesh, both conversions run in C.
+    """
+
+    mesh = obj.data
+    if obj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(mesh)
+        if bm.loops.layers.color.get(name) is None:
+            bm.loops.layers.color.new(name)
+        obj.update_from_editmode()
+
+        layer = mesh.vertex_colors[name]
+        layer.data.foreach_set("color", np.ascontiguousarray(colors, dtype=np.float32).ravel())
+        mesh.vertex_colors.active = layer
+
+        bm.clear()
+        bm.from_mesh(mesh)
+        bmesh.update_edit_mesh(mesh)
+        return
+
+    layer = mesh.vertex_colors.get(name) or mesh.vertex_colors.new(name=name)
+    layer.data.foreach_set("color", np.ascontiguousarray(colors, dtype=np.float32).ravel())
+    mesh.vertex_colors.active = layer
+    mesh.update()
+
+def get_selected_face_mask(data):
+    """Faces selected in the mesh with their uvs selected in the uv editor"""
+    if bpy.context.scene.tool_settings.use_uv_select_sync:
+        return data["face_select"].copy()
+    return data["face_select"] & data["uv_select"][data["loop_start"]]
+
+
+def get_material_image_size(material):
+    """Size of the first image texture in a material's node tree
+
+    Returns:
+        (width, height) or None
+
+    """
+
+    if material is None or not material.use_nodes or material.node_tree is None:
+        return None
+    for node in material.node_tree.nodes:
+        if node.type == 'TEX_IMAGE' and node.image is not None:
+            if node.image.size[0] != 0:
+                return node.image.size[0], node.image.size[1]
+    return None
+
+def get_face_image_sizes(obj, data, default_size):
+    """Image width and height per face resolved from each face's material,
+        faces without an image texture use the default size
+
+    Returns:
+        (size_x, size_y) arrays
+
+    """
+
+    sizes = []
+    for slot in obj.material_slots:
+        sizes.append(get_material_image_size(slot.material) or default_size)
+    if not sizes:
+        sizes.append(default_size)
+
+    sizes = np.array(sizes, dtype=np.float64)
+    slots = np.clip(data["face_materials"], 0, len(sizes) - 1)
+    return sizes[slots, 0], sizes[slots, 1]
+
+def get_face_targets(obj, data, default_density):
+    """Target texel density per face from each face's material, faces whose
+        material has no target use the default
+    """
+
+    targets = []
+    for slot in obj.material_slots:
+        material = slot.material
+        target = getattr(material, "betools_texel_density", 0.0) if material else 0.0
+        targets.append(target or default_density)
+    if not targets:
+        targets.append(default_density)
+
+    targets = np.array(targets, dtype=np.float64)
+    return targets[np.clip(data["face_materials"], 0, len(targets) - 1)]
+
+
+#######################################
+#  Areas
+#######################################
+
+def get_triangle_areas(points):
+    """Areas of (T, 3, 2) or (T, 3, 3) triangles"""
+    a = points[:, 1] - points[:, 0]
+    b = points[:, 2] - points[:, 0]
+    if points.shape[2] == 2:
+        return np.abs(a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]) * 0.5
+    return np.linalg.norm(np.cross(a, b), axis=1) * 0.5
+
+def get_face_areas(data):
+    """World space and uv space area of every face, summed from its loop
+        triangles so quads and n-gons are measured whole.
+
+    Returns:
+        (face_area, face_uv_area) arrays
+
+    """
+
+    tri_loops = data["tri_loops"]
+    face_count = len(data["loop_start"])
+
+    tri_area = get_triangle_areas(data["co"][data["loop_verts"][tri_loops]])
+    tri_uv_area = get_triangle_areas(data["uvs"][tri_loops])
+
+    face_area = np.bincount(data["tri_faces"], weights=tri_area, minlength=face_count)
+    face_uv_area = np.bincount(data["tri_faces"], weights=tri_uv_area, minlength=face_count)
+    return face_area, face_uv_area
+
+def get_texel_density(area, uv_area, size_x, size_y):
+    """Pixels per unit for the given world and uv areas. The uv area is in
+        0-1 space so the image aspect is applied by scaling it to pixels.
+    """
+
+    area = np.asarray(area, dtype=np.float64)
+    pixel_area = np.asarray(uv_area, dtype=np.float64) * size_x * size_y
+    ratio = np.divide(pixel_area, area, out=np.zeros_like(area), where=area > 0.0)
+    return np.sqrt(ratio)
+
+
+def get_heatmap_colors(density, low, target, high):
+    """Map densities onto the heatmap ramp, low to target blends from blue to
+        green and target to high from green to red
+
+    Returns:
+        (N, 4) colors
+
+    """
+
+    density = np.asarray(density, dtype=np.float64)
+    below = np.clip((density - low) / max(target - low, 1e-8), 0.0, 1.0)
+    above = np.clip((density - target) / max(high - target, 1e-8), 0.0, 1.0)
+
+    low_color, target_color, high_color = HEATMAP_COLORS
+    colors = np.where(
+        (density <= target)[:, None],
+        low_color + below[:, None] * (target_color - low_color),
+        target_color + above[:, None] * (high_color - target_color))
+    return colors
+
+
+#######################################
+#  Islands
+#######################################
+
+def get_connected_components(count, a, b):
+    """Label the components of a graph given as index pairs a[i] - b[i]
+
+    Returns:
+        (count,) array of labels from 0 to the number of components
+
+    """
+
+    parent = np.arange(count)
+    if len(a) == 0:
+        return parent
+
+    while True:
+        # hook the larger root onto the smaller one
+        root_a = parent[a]
+        root_b = parent[b]
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(parent, root_a, low)
+        np.minimum.at(parent, root_b, low)
+
+        # flatten the trees
+        while True:
+            grand_parent = parent[parent]
+            if np.array_equal(grand_parent, parent):
+                break
+            parent = grand_parent
+
+        if np.array_equal(parent[a], parent[b]):
+            break
+
+    return np.unique(parent, return_inverse=True)[1].reshape(-1)
+
+def get_uv_island_labels(data):
+    """Label every face with its uv island. Faces are connected when they
+        share a mesh edge whose uvs match on both sides.
+
+    Returns:
+        (face count,) array of island labels
+
+    """
+
+    loop_start = data["loop_start"]
+    loop_total = data["loop_total"]
+    loop_faces = data["loop_faces"]
+    face_count = len(loop_start)
+
+    # uv vertices, loops on the same vert with the same uv
+    quantized = np.round(data["uvs"] * 10 ** _UV_PRECISION).astype(np.int64)
+    keys = np.column_stack((data["loop_verts"], quantized))
+    uv_verts = np.unique(keys, axis=0, return_inverse=True)[1].reshape(-1)
+
+    # the next loop in the face, wrapping to the face start
+    next_loops = np.arange(len(loop_faces)) + 1
+    face_ends = loop_start + loop_total - 1
+    next_loops[face_ends] = loop_start
+
+    # uv edges, loops sharing one belong to neighbouring faces in the same island
+    edges = np.sort(np.column_stack((uv_verts, uv_verts[next_loops])), axis=1)
+    edge_ids = np.unique(edges, axis=0, return_inverse=True)[1].reshape(-1)
+
+    order = np.argsort(edge_ids, kind='stable')
+    sorted_ids = edge_ids[order]
+    shared = sorted_ids[1:] == sorted_ids[:-1]
+    a = loop_faces[order[:-1][shared]]
+    b = loop_faces[order[1:][shared]]
+
+    return get_connected_components(face_count, a, b)
+
+def get_island_density(face_area, face_uv_area, labels, size_x, size_y, face_mask=None):
+    """Texel density of each island from segment sums of its face areas
+
+    Args:
+        face_area (array): world space face areas
+        face_uv_area (array): uv space face areas
+        labels (array): island label per face
+        size_x (int or array): image width, or per face width
+        size_y (int or array): image height, or per face height
+        face_mask (array): only count these faces
+
+    Returns:
+        (density, area, uv_area) arrays indexed by island label
+
+    """
+
+    island_count = int(labels.max()) + 1 if len(labels) else 0
+    weights = face_mask.astype(np.float64) if face_mask is not None else 1.0
+    face_pixel_area = face_uv_area * size_x * size_y
+    area = np.bincount(labels, weights=face_area * weights, minlength=island_count)
+    uv_area = np.bincount(labels, weights=face_uv_area * weights, minlength=island_count)
+    pixel_area = np.bincount(labels, weights=face_pixel_area * weights, minlength=island_count)
+    return get_texel_density(area, pixel_area, 1, 1), area, uv_area
+
+
+#######################################
+#  Transforms
+#######################################
+
+def scale_islands(data, labels, scales, island_mask):
+    """Scale each island around its uv bounding box center
+
+    Args:
+        data (dict): mesh arrays
+        labels (array): island label per face
+        scales (array): scale per island
+        island_mask (array): islands to scale
+
+    Returns:
+        new loop uvs and the mask of faces that were changed
+
+    """
+
+    uvs = data["uvs"]
+    loop_labels = labels[data["loop_faces"]]
+    island_count = len(scales)
+
+    bounds_min = np.full((island_count, 2), np.inf)
+    bounds_max = np.full((island_count, 2), -np.inf)
+    np.minimum.at(bounds_min, loop_labels, uvs)
+    np.maximum.at(bounds_max, loop_labels, uvs)
+    center = (bounds_min + bounds_max) * 0.5
+
+    loop_mask = island_mask[loop_labels] & ~data["uv_pin"]
+    pivot = center[loop_labels]
+    scaled = (uvs - pivot) * scales[loop_labels][:, None] + pivot
+
+    new_uvs = np.where(loop_mask[:, None], scaled, uvs)
+    return new_uvs, island_mask[labels]
@@ -0,0 +1,108 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Trim slot detection from the pixels of a trim sheet image"""
+
+import numpy as np
+from . import _texel
+
+
+# larger images are scaled down before detection
+MAX_DETECT_SIZE = 2048
+
+TRIM_DETECT_MODES = [
+    ('GRADIENT', 'Gradient', 'Split at rows and columns of strong color change running across the sheet'),
+    ('COLOR_ID', 'Color ID', 'One slot per solid color region, for ID masks of the sheet')
+]
+
+
+def _get_spans(cuts, length, min_size):
+    """Spans between the cut positions that are at least min_size long"""
+    starts = np.concatenate(([0], cuts))
+    ends = np.concatenate((cuts, [length]))
+    keep = (ends - starts) >= min_size
+    return starts[keep], ends[keep]
+
+def detect_gradient_slots(pixels, threshold=0.1, coverage=0.9, min_size=0.01):
+    """Split the sheet into rows at lines where the color changes across
+        most of its width, then each row into columns the same way.
+
+    Args:
+        pixels (np.ndarray): (height, width, 4) image
+        threshold (float): per channel difference counted as an edge
+        coverage (float): part of the row or column that must be an edge
+        min_size (float): smallest slot side, relative to the image
+
+    Returns:
+        (N, 4) uv bounds (min u, min v, max u, max v)
+
+    """
+
+    height, width = pixels.shape[:2]
+    rgb = pixels[..., :3]
+    min_rows = max(1, int(min_size * height))
+    min_columns = max(1, int(min_size * width))
+
+    # edges between pixel y and y + 1, and x and x + 1
+    row_edges = np.abs(np.diff(rgb, axis=0)).max(axis=2) > threshold
+    column_edges = np.abs(np.diff(rgb, axis=1)).max(axis=2) > threshold
+
+    row_cuts = np.nonzero(row_edges.mean(axis=1) >= coverage)[0] + 1
+    row_starts, row_ends = _get_spans(row_cuts, height, min_rows)
+
+    bounds = []
+    for start, end in zip(row_starts, row_ends):
+        column_cuts = np.nonzero(column_edges[start:end].mean(axis=0) >= coverage)[0] + 1
+        column_starts, column_ends = _get_spans(column_cuts, width, min_columns)
+        for column_start, column_end in zip(column_starts, column_ends):
+            bounds.append((column_start, start, column_end, end))
+
+    bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+    return bounds / (width, height, width, height)
+
+def detect_color_slots(pixels, min_size=0.01, min_fill=0.5):
+    """One slot per connected region of a single color. Regions filling
+        less than min_fill of their bounds (gutters, backgrounds) are skipped.
+
+    Args:
+        pixels (np.ndarray): (height, width, 4) image
+        min_size (float): smallest slot side, relative to the image
+        min_fill (float): smallest part of its bounds a region must cover
+
+    Returns:
+        (N, 4) uv bounds (min u, min v, max u, max v)
+
+    """
+
+    height, width = pixels.shape[:2]
+    quantized = (np.clip(pixels[..., :3], 0.0, 1.0) * 255 + 0.5).astype(np.int32)
+    ids = (quantized[..., 0] << 16) | (quantized[..., 1] << 8) | quantized[..., 2]
+
+    # runs of one color along each row
+    starts = np.ones((height, width), dtype=bool)
+    starts[:, 1:] = ids[:, 1:] != ids[:, :-1]
+    run_ids = np.cumsum(starts.ravel()).reshape(height, width) - 1
+    run_rows, run_starts = np.nonzero(starts)
+    run_ends = np.append(run_starts[1:], width)
+    run_ends[np.append(run_rows[1:] != run_rows[:-1], True)] = width
+
+    # overlapping runs of the same color in neighbouring rows, any overlap
+    # contains the start of one of the two runs
+    linked = (starts[:-1] | starts[1:]) & (ids[:-1] == ids[1:])
+    labels = _texel.get_connected_components(
+        len(run_rows), run_ids[:-1][linked], run_ids[1:][linked])
+
+    count = int(labels.max()) + 1
+    region_min = np.full((count, 2), np.iinfo(np.int64).max)
+    region_max = np.full((count, 2), -1)
+    np.minimum.at(region_min, labels, np.column_stack((run_starts, run_rows)))
+    np.maximum.at(region_max, labels, np.column_stack((run_ends, run_rows + 1)))
+
+    size = region_max - region_min
+    fill = np.bincount(labels, weights=run_ends - run_starts, minlength=count) / (size[:, 0] * size[:, 1])
+    keep = (size[:, 0] >= min_size * width) & (size[:, 1] >= min_size * height) & (fill >= min_fill)
+
+    bounds = np.hstack((region_min, region_max))[keep].astype(np.float64)
+    return bounds / (width, height, width, height)
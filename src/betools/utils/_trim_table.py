@@ -0,0 +1,506 @@
+#################################################################
+# Be Tools by Bruce Evans                                       #
+# brucein3d@gmail.com                                           #
+#################################################################
+
+"""Compiled trim slot tables, persisted on the scene"""
+
+import hashlib
+import bpy
+import numpy as np
+from mathutils import Vector
+from . import _bounds
+from . import _raster
+from . import _trim_image
+from .. import _settings
+
+
+# scene custom property holding the compiled table
+TRIM_PROPERTY = "betools_trim_table"
+
+# scene custom property holding the compiled library tables by template name
+TRIM_LIBRARY_PROPERTY = "betools_trim_library"
+
+# template meshes must be flat on the XZ plane
+_DEPTH_THRESHOLD = 0.0001
+
+# slot bounds closer than this touch
+_EPSILON = 0.000001
+
+# columns of TrimTable.neighbors
+DIRECTIONS = ('UP', 'DOWN', 'LEFT', 'RIGHT')
+
+
+class TrimTable():
+    """Trim slots of a template as a (N, 4) array of uv bounds
+        (min u, min v, max u, max v), sorted top row first.
+
+    Lookups go through indices built once per table: slots sorted by aspect
+    ratio for matching and by min u for stepping, the slots covering each
+    band between the distinct v bounds for point queries, and the
+    neighbouring slot in each of DIRECTIONS.
+
+    Tables detected from an image keep the compile_image keyword arguments
+    in detect, so a recompile detects the slots the same way.
+    """
+
+    def __init__(self, bounds, template="", key="", source='MESH', detect=None):
+        self.bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        self.template = template
+        self.key = key
+        self.source = source
+        self.detect = dict(detect) if detect else {}
+        self.slots = [_bounds_to_slot(bound) for bound in self.bounds.tolist()]
+        self._build_index()
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def _build_index(self):
+        u_min, v_min, u_max, v_max = self.bounds.T
+        width = u_max - u_min
+        height = v_max - v_min
+        self.ratios = np.divide(width, height, out=np.full(len(width), np.inf), where=height > 0.0)
+
+        # stable sorts keep equal keys in table order
+        self.ratio_order = np.argsort(self.ratios, kind='stable')
+        self.sorted_ratios = self.ratios[self.ratio_order]
+        self.u_order = np.argsort(u_min, kind='stable')
+        self.u_rank = np.empty(len(self.u_order), dtype=np.int64)
+        self.u_rank[self.u_order] = np.arange(len(self.u_order))
+
+        # v bands, each listing its covering slots by min u
+        self.v_breaks = np.unique(np.concatenate((v_min, v_max)))
+        self.band_slots = []
+        for band_min in self.v_breaks[:-1]:
+            covering = self.u_order[(v_min[self.u_order] <= band_min) & (v_max[self.u_order] > band_min)]
+            self.band_slots.append(covering)
+
+        self.neighbors = _get_neighbors(self.bounds)
+
+    def match_ratio(self, ratio):
+        """Slot indices with the closest width to height ratio
+
+        Args:
+            ratio (float or np.ndarray): island width / height
+
+        Returns:
+            int or np.ndarray, -1 for an empty table
+
+        """
+
+        ratio = np.asarray(ratio, dtype=np.float64)
+        if not len(self):
+            return np.full(ratio.shape, -1, dtype=np.int64)[()]
+
+        count = len(self.sorted_ratios)
+        right = np.clip(np.searchsorted(self.sorted_ratios, ratio, side='left'), 0, count - 1)
+        # first of the equal ratios on the left so ties keep table order
+        left = np.clip(np.searchsorted(self.sorted_ratios, ratio, side='left') - 1, 0, count - 1)
+        left = np.searchsorted(self.sorted_ratios, self.sorted_ratios[left], side='left')
+
+        left_diff = np.abs(ratio - self.sorted_ratios[left])
+        right_diff = np.abs(ratio - self.sorted_ratios[right])
+        left_index = self.ratio_order[left]
+        right_index = self.ratio_order[right]
+        use_left = (left_diff < right_diff) | ((left_diff == right_diff) & (left_index < right_index))
+        return np.where(use_left, left_index, right_index)[()]
+
+    def slot_at(self, u, v):
+        """Index of the first slot containing the point, -1 outside every
+            slot. Min bounds are inclusive, max bounds exclusive.
+        """
+
+        band = np.searchsorted(self.v_breaks, v, side='right') - 1
+        if band < 0 or band >= len(self.band_slots):
+            return -1
+
+        covering = self.band_slots[band]
+        count = np.searchsorted(self.bounds[covering, 0], u, side='right')
+        candidates = covering[:count]
+        candidates = candidates[self.bounds[candidates, 2] > u]
+        if not len(candidates):
+            return -1
+        return int(candidates.min())
+
+    def neighbor(self, index, direction):
+        """Adjacent slot in a direction of DIRECTIONS, wrapping around the
+            row or column at the sheet edges
+        """
+
+        return int(self.neighbors[index, DIRECTIONS.index(direction)])
+
+    def shift_islands(self, island_min, island_max, direction):
+        """Neighbour slots of the slots holding each island's min corner.
+            Islands outside every slot go to their closest ratio slot.
+
+        Returns:
+            (N,) slot indices
+
+        """
+
+        size = island_max - island_min
+        ratio = np.divide(size[:, 0], size[:, 1], out=np.full(len(size), np.inf), where=size[:, 1] > 0.0)
+        slots = np.asarray(self.match_ratio(ratio), dtype=np.int64).reshape(-1)
+
+        column = DIRECTIONS.index(direction)
+        for i, (u, v) in enumerate(island_min + _EPSILON):
+            current = self.slot_at(u, v)
+            if current >= 0:
+                slots[i] = self.neighbors[current, column]
+        return slots
+
+    def step_by_u(self, index, direction):
+        """Slot index `direction` steps along the slots sorted by min u,
+            wrapping at either end
+        """
+
+        rank = (self.u_rank[index] + direction) % len(self)
+        return int(self.u_order[rank])
+
+    def to_property(self):
+        return {
+            "template": self.template,
+            "hash": self.key,
+            "source": self.source,
+            "detect": self.detect,
+            "bounds": self.bounds.ravel().tolist()
+        }
+
+    @classmethod
+    def from_property(cls, prop):
+        return cls(list(prop["bounds"]), prop["template"], prop["hash"], prop.get("source", 'MESH'),
+                   prop.get("detect"))
+
+
+def _get_nearest(candidates, key, overlap):
+    """Per row of the candidate matrix, the candidate with the lowest key,
+        ties going to the largest overlap. -1 without candidates.
+    """
+
+    if not candidates.size:
+        return np.full(len(candidates), -1, dtype=np.int64)
+
+    masked_key = np.where(candidates, key, np.inf)
+    best_key = masked_key.min(axis=1)
+    best = candidates & (masked_key <= best_key[:, None] + _EPSILON)
+    nearest = np.where(best, overlap, -np.inf).argmax(axis=1)
+    return np.where(candidates.any(axis=1), nearest, -1)
+
+def _get_neighbors(bounds):
+    """Adjacent slot of every slot in each of DIRECTIONS, slots sharing a
+        row or column with the most overlap win. At the edge of the sheet
+        the slot wraps to the far end of its row or column.
+
+    Returns:
+        (N, 4) slot indices
+
+    """
+
+    u_min, v_min, u_max, v_max = (column[:, None] for column in bounds.T)
+    u_overlap = np.minimum(u_max, u_max.T) - np.maximum(u_min, u_min.T)
+    v_overlap = np.minimum(v_max, v_max.T) - np.maximum(v_min, v_min.T)
+    same_column = u_overlap > _EPSILON
+    same_row = v_overlap > _EPSILON
+
+    above = same_column & (v_min.T >= v_max - _EPSILON)
+    below = same_column & (v_max.T <= v_min + _EPSILON)
+    left = same_row & (u_max.T <= u_min + _EPSILON)
+    right = same_row & (u_min.T >= u_max - _EPSILON)
+
+    count = len(bounds)
+    neighbors = np.empty((count, len(DIRECTIONS)), dtype=np.int64)
+    # the key of the nearest slot ahead is also the key of the farthest behind
+    directions = (
+        (above, below, v_min.T, u_overlap),
+        (below, above, -v_max.T, u_overlap),
+        (left, right, -u_max.T, v_overlap),
+        (right, left, u_min.T, v_overlap)
+    )
+    for i, (forward, backward, key, overlap) in enumerate(directions):
+        keys = np.broadcast_to(key, (count, count))
+        nearest = _get_nearest(forward, keys, overlap)
+
+        # wrap to the farthest slot the other way, or stay
+        wrap = _get_nearest(backward, keys, overlap)
+        nearest = np.where(nearest < 0, wrap, nearest)
+        neighbors[:, i] = np.where(nearest < 0, np.arange(count), nearest)
+    return neighbors
+
+def _bounds_to_slot(bound):
+    """Slot dictionary used by the trim fit functions"""
+    x_min, y_min, x_max, y_max = bound
+    width = x_max - x_min
+    height = y_max - y_min
+    return {
+        "min": Vector((x_min, y_min)),
+        "max": Vector((x_max, y_max)),
+        "width": width,
+        "height": height,
+        "area": width * height,
+        "center": Vector((x_min + width / 2.0, y_min + height / 2.0))
+    }
+
+def _get_template_arrays(template):
+    """World space vertex positions and face loops of the template mesh"""
+    co = _bounds.get_vertex_positions(template)
+    mesh = template.data
+
+    loop_verts = np.empty(len(mesh.loops), dtype=np.int64)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    loop_start = np.empty(len(mesh.polygons), dtype=np.int64)
+    mesh.polygons.foreach_get("loop_start", loop_start)
+
+    return co, loop_verts, loop_start
+
+def get_template_hash(template):
+    """Hash of the template's world space geometry, changes whenever the
+        compiled slots would
+    """
+
+    return _hash_arrays(*_get_template_arrays(template))
+
+def _hash_arrays(co, loop_verts, loop_start):
+    digest = hashlib.sha1()
+    digest.update(co.astype(np.float32).tobytes())
+    digest.update(loop_verts.tobytes())
+    digest.update(loop_start.tobytes())
+    return digest.hexdigest()
+
+def compile_template(template):
+    """Map each face of a template plane on the XZ plane to its uv bounds.
+        The template's width spans 0-1 in uv space.
+
+    Returns:
+        TrimTable, empty when the template isn't flat
+
+    """
+
+    co, loop_verts, loop_start = _get_template_arrays(template)
+    key = _hash_arrays(co, loop_verts, loop_start)
+    if not len(loop_start):
+        return TrimTable([], template.name, key)
+
+    mesh_min = co.min(axis=0)
+    mesh_max = co.max(axis=0)
+    if (mesh_max[1] - mesh_min[1]) > _DEPTH_THRESHOLD:
+        return TrimTable([], template.name, key)
+
+    face_co = co[loop_verts]
+    face_min = np.minimum.reduceat(face_co, loop_start, axis=0)
+    face_max = np.maximum.reduceat(face_co, loop_start, axis=0)
+
+    scalar = 1.0 / (mesh_max[0] - mesh_min[0])
+    uv_min = (face_min[:, [0, 2]] - mesh_min[[0, 2]]) * scalar  # y in uv space, z in 3D
+    uv_max = (face_max[:, [0, 2]] - mesh_min[[0, 2]]) * scalar
+
+    # sort by max z to build vertical order (3D space)
+    order = np.argsort(-face_max[:, 2], kind='stable')
+    bounds = np.hstack((uv_min, uv_max))[order]
+    return TrimTable(bounds, template.name, key)
+
+def compile_image(image, mode='GRADIENT', threshold=0.1, coverage=0.9, min_size=0.01):
+    """Detect the trim slots of a trim sheet image, see utils._trim_image
+
+    Returns:
+        TrimTable, empty when nothing was found
+
+    """
+
+    pixels = _raster.read_image_pixels(image, _trim_image.MAX_DETECT_SIZE)
+    if mode == 'COLOR_ID':
+        bounds = _trim_image.detect_color_slots(pixels, min_size)
+    else:
+        bounds = _trim_image.detect_gradient_slots(pixels, threshold, coverage, min_size)
+
+    # top row first, like the template planes
+    order = np.argsort(-bounds[:, 3], kind='stable')
+    key = "{}x{}".format(*image.size)
+    detect = {"mode": mode, "threshold": threshold, "coverage": coverage, "min_size": min_size}
+    return TrimTable(bounds[order], image.name, key, source='IMAGE', detect=detect)
+
+def store_trim_table(scene, table):
+    scene[TRIM_PROPERTY] = table.to_property()
+    _settings.trim_table = table
+
+def has_library_table(scene, name):
+    library = scene.get(TRIM_LIBRARY_PROPERTY)
+    return name in _settings.trim_library or (library is not None and name in library)
+
+def store_library_table(scene, table):
+    if TRIM_LIBRARY_PROPERTY not in scene:
+        scene[TRIM_LIBRARY_PROPERTY] = {}
+    scene[TRIM_LIBRARY_PROPERTY][table.template] = table.to_property()
+    _settings.trim_library[table.template] = table
+
+def _get_template(name, source=None):
+    """(source, template) of a template mesh or trim sheet image name"""
+    if source != 'IMAGE':
+        template = bpy.data.objects.get(name)
+        if template is not None and template.type == 'MESH':
+            return 'MESH', template
+    if source != 'MESH':
+        template = bpy.data.images.get(name)
+        if template is not None:
+            return 'IMAGE', template
+    return None, None
+
+def _find_table(table, prop, source, template):
+    """The cached table or the stored property while they match the
+        template. Slots detected from an image are kept until the image is
+        detected again or its size changes.
+    """
+
+    if source == 'MESH':
+        key = get_template_hash(template)
+    else:
+        key = "{}x{}".format(*template.size)
+
+    current = (source, template.name, key)
+    if table is not None and (table.source, table.template, table.key) == current:
+        return table
+    if prop is not None and (prop.get("source", 'MESH'), prop.get("template"), prop.get("hash")) == current:
+        return TrimTable.from_property(prop)
+    return None
+
+def _get_detect(table, prop, template):
+    """Detection settings last used on the template image, from the cached
+        table or the stored property, empty for the defaults
+    """
+
+    if table is not None and table.template == template.name:
+        return table.detect
+    if prop is not None and prop.get("template") == template.name:
+        return dict(prop.get("detect", {}))
+    return {}
+
+def _compile(source, template, detect=None):
+    if source == 'MESH':
+        return compile_template(template)
+    return compile_image(template, **(detect or {}))
+
+def get_trim_table(context):
+    """Trim table of the scene's template. Reuses the cached or stored table
+        while the template geometry is unchanged and recompiles otherwise.
+
+    Returns:
+        TrimTable or None without a template
+
+    """
+
+    scene = context.scene
+    settings = scene.betools_settings
+    if settings.trim_image:
+        source, template = _get_template(settings.trim_image, 'IMAGE')
+    else:
+        source, template = _get_template(settings.trim_mesh, 'MESH')
+    if template is None:
+        return None
+
+    prop = scene.get(TRIM_PROPERTY)
+    table = _find_table(_settings.trim_table, prop, source, template)
+    if table is None:
+        table = _compile(source, template, _get_detect(_settings.trim_table, prop, template))
+        store_trim_table(scene, table)
+    _settings.trim_table = table
+    return table
+
+def get_library_table(scene, name):
+    """Trim library entry of a template mesh or trim sheet image, compiled
+        once and then reused from the cache or the scene like get_trim_table.
+        Images are detected with the entry's own settings, or the settings
+        of the scene's table when it came from the same image.
+
+    Returns:
+        TrimTable or None when nothing has that name
+
+    """
+
+    source, template = _get_template(name)
+    if template is None:
+        return None
+
+    library = scene.get(TRIM_LIBRARY_PROPERTY)
+    prop = library.get(name) if library is not None else None
+    table = _find_table(_settings.trim_library.get(name), prop, source, template)
+    if table is None:
+        detect = _get_detect(_settings.trim_library.get(name), prop, template)
+        if not detect:
+            detect = _get_detect(_settings.trim_table, scene.get(TRIM_PROPERTY), template)
+        table = _compile(source, template, detect)
+        store_library_table(scene, table)
+    _settings.trim_library[name] = table
+    return table
+
+def get_material_trim_table(context, material):
+    """Library table of the material's trim template, the scene's table
+        for materials without one
+    """
+
+    name = material.betools_trim_template if material is not None else ""
+    if name:
+        table = get_library_table(context.scene, name)
+        if table is not None:
+            return table
+    return get_trim_table(context)
+
+def fit_islands(table, island_min, island_max, fit_mode, layout='OVERLAP'):
+    """Assign each island to its closest ratio slot and compute the fit.
+        A uv moves to (uv - island min) * scale + target min.
+
+    Args:
+        table (TrimTable)
+        island_min (np.ndarray): (N, 2) island uv bounds min
+        island_max (np.ndarray): (N, 2) island uv bounds max
+        fit_mode (str): one of _constants.TRIM_FIT_MODES
+        layout (str): OVERLAP fits every island to the whole slot, STACK
+            splits the slot height and TILE the slot width between the
+            islands sharing it
+
+    Returns:
+        (slots, scale, target_min) arrays
+
+    """
+
+    size = island_max - island_min
+    ratio = np.divide(size[:, 0], size[:, 1], out=np.full(len(size), np.inf), where=size[:, 1] > 0.0)
+    slots = np.asarray(table.match_ratio(ratio), dtype=np.int64).reshape(-1)
+    scale, target_min = fit_to_slots(table, slots, island_min, island_max, fit_mode, layout)
+    return slots, scale, target_min
+
+def fit_to_slots(table, slots, island_min, island_max, fit_mode, layout='OVERLAP'):
+    """Scale and target of islands already assigned to slots, see fit_islands
+
+    Returns:
+        (scale, target_min) arrays
+
+    """
+
+    size = island_max - island_min
+    target_min = table.bounds[slots, :2].copy()
+    target_size = table.bounds[slots, 2:] - table.bounds[slots, :2]
+
+    if layout != 'OVERLAP' and len(slots):
+        axis = 0 if layout == 'TILE' else 1
+        count = np.bincount(slots, minlength=len(table))
+
+        # rank of each island within its slot, keeping their current order
+        order = np.lexsort((island_min[:, axis], slots))
+        sorted_slots = slots[order]
+        rank = np.empty(len(slots), dtype=np.int64)
+        rank[order] = np.arange(len(slots)) - np.searchsorted(sorted_slots, sorted_slots, side='left')
+
+        target_size[:, axis] /= count[slots]
+        target_min[:, axis] += rank * target_size[:, axis]
+
+    scale = np.divide(target_size, size, out=np.ones_like(size), where=size > 0.0)
+    if fit_mode == 'VERTICAL':
+        scale[:, 0] = 1.0
+    elif fit_mode == 'HORIZONTAL':
+        scale[:, 1] = 1.0
+    elif fit_mode == 'VERTICAL_FIT':
+        scale[:, 0] = scale[:, 1]
+    elif fit_mode == 'HORIZONTAL_FIT':
+        scale[:, 1] = scale[:, 0]
+
+    return scale, target_min
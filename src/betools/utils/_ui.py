@@ -1,15 +1,88 @@
-
-import os
 import bpy
 
 
+class UVEditor():
+    """ An image editor with its window, screen, area and region. The image,
+        its size and the 2D cursor are read live from the space so they stay
+        current while an operator keeps the editor around.
+    """
+
+    def __init__(self, window, screen, area, region):
+        self.window = window
+        self.screen = screen
+        self.area = area
+        self.region = region
+        self.space = area.spaces.active
+
+    @property
+    def image(self):
+        return self.space.image
+
+    @property
+    def image_size(self):
+        """ Size of the displayed image, 256 x 256 without one
+        """
+        image = self.space.image
+        if image is not None and image.size[0] != 0:
+            return image.size[0], image.size[1]
+        return 256, 256
+
+    @property
+    def cursor(self):
+        return self.space.cursor_location
+
+    def override(self):
+        return {
+            'window': self.window,
+            'screen': self.screen,
+            'area': self.area,
+            'region': self.region,
+            'scene': bpy.context.scene,
+            'edit_object': bpy.context.edit_object,
+            'active_object': bpy.context.active_object,
+            'selected_objects': bpy.context.selected_objects
+        }   # Stuff the override context with very common requests by operators.  MORE COULD BE NEEDED!
+
+
+def _find_uv_editor(window, screen):
+    for area in screen.areas:
+        if area.type == 'IMAGE_EDITOR':
+            for region in area.regions:
+                if region.type == 'WINDOW':
+                    return UVEditor(window, screen, area, region)
+    return None
+
+def get_uv_editor(context=None, any_window=False):
+    """ Resolve the image editor of the current screen. Operators resolve it
+        once per execute and pass it down instead of calling this per vertex.
+
+        args:
+            context: bpy.types.Context, bpy.context when None
+            any_window: also search the screens of the other windows
+
+        returns:
+            UVEditor or None
+    """
+
+    if context is None:
+        context = bpy.context
+    editor = None
+    if context.screen is not None:
+        editor = _find_uv_editor(context.window, context.screen)
+    if editor is not None or not any_window:
+        return editor
+
+    window_manager = context.window_manager
+    if window_manager is None:
+        return None
+    for window in window_manager.windows:
+        editor = _find_uv_editor(window, window.screen)
+        if editor is not None:
+            return editor
+    return None
+
 def GetUVView():
-    for window in bpy.context.window_manager.windows:
-        screen = window.screen
-        for area in screen.areas:
-            if area.type == 'IMAGE_EDITOR': 
-                for region in area.regions:
-                    if region.type == 'WINDOW': 
-                        override = {'window': window, 'screen': screen, 'area': area, 'region': region, 'scene': bpy.context.scene, 'edit_object': bpy.context.edit_object, 'active_object': bpy.context.active_object, 'selected_objects': bpy.context.selected_objects}   # Stuff the override context with very common requests by operators.  MORE COULD BE NEEDED!
-                        return override
-    return None
\ No newline at end of file
+    editor = get_uv_editor(any_window=True)
+    if editor is None:
+        return None
+    return editor.override()
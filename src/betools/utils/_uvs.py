@@ -223,15 +223,11 @@ def get_faces_from_uvs(bm, uv_layers):
     return faces
 
 def get_area_triangle_uv(A, B, C, size_x, size_y):
-	scale_x = size_x / max(size_x, size_y)
-	scale_y = size_y / max(size_x, size_y)
-	A.x/=scale_x
-	B.x/=scale_x
-	C.x/=scale_x
-	
-	A.y/=scale_y
-	B.y/=scale_y
-	C.y/=scale_y
+	# work on copies, the uvs passed in are often live loop uvs
+	scale = Vector((max(size_x, size_y) / size_x, max(size_x, size_y) / size_y))
+	A = Vector((A.x * scale.x, A.y * scale.y))
+	B = Vector((B.x * scale.x, B.y * scale.y))
+	C = Vector((C.x * scale.x, C.y * scale.y))
 
 	return get_area_triangle(A, B, C)
 
@@ -484,7 +480,7 @@ def get_padding():
 #  Image Helpers
 #######################################
 
-def get_current_image():
-    for area in bpy.context.screen.areas:
-        if area.type == 'IMAGE_EDITOR':
-                return area.spaces.active.image
+def get_current_image(context=None):
+    editor = _ui.get_uv_editor(context)
+    if editor:
+        return editor.image